@@ -1,12 +1,39 @@
 import os
 import firebase_admin
 from firebase_admin import credentials, firestore, storage, auth
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
+import atexit
+import bisect
+import csv
 import datetime
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import mimetypes
+import random
+import tempfile
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # --- NEW IMPORTS ---
 from dotenv import load_dotenv
+import requests
+from google.api_core import exceptions as google_exceptions
+from google.auth import exceptions as google_auth_exceptions
+from werkzeug.datastructures import FileStorage, MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
 import sib_api_v3_sdk
 from sib_api_v3_sdk.rest import ApiException
 
@@ -18,18 +45,349 @@ app = Flask(__name__)
 # Make sure this is your React port
 CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}}) 
 
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred, {
-    'storageBucket': 'blockchain-a9608.firebasestorage.app' 
-})
+# Firestore (gRPC) and Storage clients must not be shared across forked
+# workers, so they are created per process. gunicorn.conf.py sets
+# DEFER_FIREBASE_INIT=1 and calls init_firebase() from its post_fork hook.
+db = None
+bucket = None
 
-db = firestore.client()
-bucket = storage.bucket()
+def init_firebase():
+    """Initializes Firebase and creates this process's Firestore/Storage clients."""
+    global db, bucket
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cred = credentials.Certificate("serviceAccountKey.json")
+        firebase_admin.initialize_app(cred, {
+            'storageBucket': 'blockchain-a9608.firebasestorage.app' 
+        })
+
+    db = firestore.client()
+    bucket = storage.bucket()
+
+if os.getenv("DEFER_FIREBASE_INIT") != "1":
+    init_firebase()
+
+# --- Background Work (emails and other side effects that shouldn't block a request) ---
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4"))
+_background_executor = None
+_background_executor_pid = None
+_background_lock = threading.Lock()
+
+def submit_background(fn, *args, **kwargs):
+    """Runs `fn` on this process's background thread pool."""
+    global _background_executor, _background_executor_pid
+    with _background_lock:
+        # Threads don't survive a fork, so each worker builds its own pool on first use
+        if _background_executor is None or _background_executor_pid != os.getpid():
+            _background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="background")
+            _background_executor_pid = os.getpid()
+        return _background_executor.submit(fn, *args, **kwargs)
+
+def drain_background_work():
+    """
+    Retries side effects parked by open circuit breakers, then waits for
+    queued background work to finish. Called on worker shutdown.
+    """
+    global _background_executor
+    for breaker in CIRCUIT_BREAKERS:
+        breaker.flush_deferred()
+    with _background_lock:
+        executor = _background_executor if _background_executor_pid == os.getpid() else None
+        _background_executor = None
+    if executor is not None:
+        print("Draining background work before shutdown...")
+        executor.shutdown(wait=True)
+
+atexit.register(drain_background_work)
 
 # --- Brevo (Sendinblue) API Configuration ---
 configuration = sib_api_v3_sdk.Configuration()
 configuration.api_key['api-key'] = os.getenv("BREVO_API_KEY")
 
+# --- Archival Configuration ---
+ARCHIVE_MIN_AGE_DAYS = int(os.getenv("ARCHIVE_MIN_AGE_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "200")) # Each record costs 2 batch writes (index + delete), Firestore caps a batch at 500
+
+# --- Upload Limits ---
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(60 * 1024 * 1024)))
+UPLOAD_MAX_FIELD_BYTES = int(os.getenv("UPLOAD_MAX_FIELD_BYTES", str(64 * 1024))) # All text fields together
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(1024 * 1024))) # Bigger files go to a temp file
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Resumable uploads to Storage send (and buffer) this much at a time; must be a multiple of 256 KB
+STORAGE_UPLOAD_CHUNK_SIZE = int(os.getenv("STORAGE_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Hard cap for every request; Werkzeug rejects bodies over this with a 413
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_REQUEST_BYTES
+
+# --- Export Configuration ---
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+
+# --- Resilience Configuration (deadlines in seconds) ---
+FIRESTORE_TIMEOUT_SECONDS = float(os.getenv("FIRESTORE_TIMEOUT_SECONDS", "5"))
+STORAGE_TIMEOUT_SECONDS = float(os.getenv("STORAGE_TIMEOUT_SECONDS", "30"))
+BREVO_TIMEOUT_SECONDS = float(os.getenv("BREVO_TIMEOUT_SECONDS", "5"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+FIRESTORE_HEDGE_DELAY_MS = int(os.getenv("FIRESTORE_HEDGE_DELAY_MS", "0")) # 0 = hedged reads off
+DEFERRED_SIDE_EFFECTS_MAX = int(os.getenv("DEFERRED_SIDE_EFFECTS_MAX", "1000")) # Per breaker, in memory only (best-effort)
+
+# --- Review Queue Leases ---
+QUEUE_LEASE_SECONDS = int(os.getenv("QUEUE_LEASE_SECONDS", "1800"))
+QUEUE_MAX_CLAIM = int(os.getenv("QUEUE_MAX_CLAIM", "10"))
+QUEUE_SCAN_FACTOR = 3 # Look at this many candidates per requested item, so admins claiming at once rarely collide
+
+# --- Search Index ---
+SEARCH_FUZZY_THRESHOLD = float(os.getenv("SEARCH_FUZZY_THRESHOLD", "0.4"))
+SEARCH_MAX_PAGE_SIZE = 50
+# Built once by `flask --app app search-indexer`; web workers only read this file
+SEARCH_SNAPSHOT_PATH = os.getenv("SEARCH_SNAPSHOT_PATH", "search_index.json.gz")
+SEARCH_SNAPSHOT_WRITE_SECONDS = float(os.getenv("SEARCH_SNAPSHOT_WRITE_SECONDS", "15"))
+SEARCH_SNAPSHOT_CHECK_SECONDS = float(os.getenv("SEARCH_SNAPSHOT_CHECK_SECONDS", "5"))
+
+# --- Transaction Detail (aggregated stage-page payload) ---
+TX_DETAIL_CACHE_SIZE = int(os.getenv("TX_DETAIL_CACHE_SIZE", "512"))
+TX_DETAIL_CACHE_TTL_SECONDS = float(os.getenv("TX_DETAIL_CACHE_TTL_SECONDS", "15"))
+TX_DETAIL_LOG_LIMIT = int(os.getenv("TX_DETAIL_LOG_LIMIT", "20"))
+FAN_OUT_WORKERS = int(os.getenv("FAN_OUT_WORKERS", "8"))
+
+# --- Analytics Store (fed by `flask --app app cdc`) ---
+ANALYTICS_DB_PATH = os.getenv("ANALYTICS_DB_PATH", "analytics.sqlite3")
+
+# --- Parcel Index Cache ---
+PARCEL_CACHE_SIZE = int(os.getenv("PARCEL_CACHE_SIZE", "2048"))
+PARCEL_CACHE_TTL_SECONDS = float(os.getenv("PARCEL_CACHE_TTL_SECONDS", "60")) # Bounds staleness from writes made by other workers
+
+# ===================================================================
+# --- RESILIENCE: DEADLINES, CIRCUIT BREAKERS & HEDGED READS ---
+# ===================================================================
+
+class DependencyUnavailable(Exception):
+    """Raised when a call is refused because its dependency's breaker is open."""
+
+# Errors that mean the dependency itself is struggling. Anything else (bad
+# argument, missing document or index, aborted transaction) is caused by the
+# request and must not count against the dependency's health.
+TRANSIENT_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.TooManyRequests, # ResourceExhausted is a subclass
+    google_exceptions.RetryError,
+    google_auth_exceptions.TransportError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    TimeoutError,
+)
+
+class CircuitBreaker:
+    """
+    Per-dependency circuit breaker. Opens after `failure_threshold` failures
+    in a row, then lets a single trial call through once `reset_timeout`
+    seconds have passed (half-open). A successful trial closes it again and
+    replays any side effects that were deferred while it was open.
+
+    Deferral is best-effort: parked calls live in this worker's memory only.
+    They are retried once on graceful shutdown, and anything that still can't
+    run (or overflows DEFERRED_SIDE_EFFECTS_MAX) is logged as dropped.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.deferred = deque(maxlen=DEFERRED_SIDE_EFFECTS_MAX)
+        self.totals = {"success": 0, "failure": 0, "rejected": 0, "deferred": 0, "opened": 0}
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns True if a call may go ahead right now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+            if self.state == "half-open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.totals["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.totals["success"] += 1
+            self.consecutive_failures = 0
+            self.trial_in_flight = False
+            was_open = self.state != "closed"
+            self.state = "closed"
+            replay = list(self.deferred) if was_open else []
+            if was_open:
+                self.deferred.clear()
+        if was_open:
+            print(f"Circuit breaker '{self.name}' closed. Replaying {len(replay)} deferred calls.")
+            for fn, args, kwargs in replay:
+                submit_background(fn, *args, **kwargs)
+
+    def record_failure(self):
+        with self._lock:
+            self.totals["failure"] += 1
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+            if self.state == "half-open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.totals["opened"] += 1
+                    print(f"WARNING: Circuit breaker '{self.name}' opened after {self.consecutive_failures} failures.")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Frees the half-open trial slot without changing the breaker's state."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Runs `fn` through the breaker. Raises DependencyUnavailable when open.
+        Only TRANSIENT_ERRORS count as failures; other errors are re-raised as-is.
+        """
+        if not self.allow():
+            raise DependencyUnavailable(f"{self.name} is temporarily unavailable")
+        try:
+            result = fn(*args, **kwargs)
+        except TRANSIENT_ERRORS:
+            self.record_failure()
+            raise
+        except Exception:
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+    def defer(self, fn, *args, **kwargs):
+        """Parks a non-critical call until the breaker closes again."""
+        with self._lock:
+            if len(self.deferred) == self.deferred.maxlen:
+                self._log_dropped([self.deferred[0]], "queue full")
+            self.deferred.append((fn, args, kwargs))
+            self.totals["deferred"] += 1
+
+    def _log_dropped(self, calls, reason):
+        for fn, args, kwargs in calls:
+            target = repr(args[0]) if args else ""
+            print(f"WARNING: Dropped deferred '{self.name}' call {fn.__name__}({target}) ({reason}).")
+
+    def flush_deferred(self):
+        """
+        Called on shutdown: gives every parked call one more try. Calls that
+        get parked again (the breaker is still open) are logged as dropped.
+        """
+        with self._lock:
+            pending = list(self.deferred)
+            self.deferred.clear()
+        if not pending:
+            return
+        print(f"Circuit breaker '{self.name}': retrying {len(pending)} deferred calls before shutdown.")
+        for fn, args, kwargs in pending:
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self._log_dropped([(fn, args, kwargs)], f"failed: {e}")
+        with self._lock:
+            dropped = list(self.deferred)
+            self.deferred.clear()
+        self._log_dropped(dropped, "dependency still unavailable at shutdown")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutiveFailures": self.consecutive_failures,
+                "deferredQueued": len(self.deferred),
+                **self.totals
+            }
+
+firestore_breaker = CircuitBreaker("firestore")
+storage_breaker = CircuitBreaker("storage")
+brevo_breaker = CircuitBreaker("brevo")
+CIRCUIT_BREAKERS = (firestore_breaker, storage_breaker, brevo_breaker)
+
+_hedge_executor = None
+_hedge_executor_pid = None
+
+def hedged_read(fn, *args):
+    """
+    Runs an idempotent Firestore read through the breaker. If it hasn't
+    answered within FIRESTORE_HEDGE_DELAY_MS, a second copy is sent and the
+    first successful answer wins.
+    """
+    global _hedge_executor, _hedge_executor_pid
+    if FIRESTORE_HEDGE_DELAY_MS <= 0:
+        return firestore_breaker.call(fn, *args)
+
+    with _background_lock:
+        if _hedge_executor is None or _hedge_executor_pid != os.getpid():
+            _hedge_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS * 2, thread_name_prefix="hedge")
+            _hedge_executor_pid = os.getpid()
+
+    pending = {_hedge_executor.submit(firestore_breaker.call, fn, *args)}
+    done, pending = wait(pending, timeout=FIRESTORE_HEDGE_DELAY_MS / 1000)
+    if not done:
+        pending.add(_hedge_executor.submit(firestore_breaker.call, fn, *args))
+
+    deadline = time.monotonic() + FIRESTORE_TIMEOUT_SECONDS
+    last_error = None
+    while True:
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            last_error = future.exception()
+        remaining = deadline - time.monotonic()
+        if not pending or remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    if last_error is not None:
+        raise last_error
+    raise DependencyUnavailable("firestore read timed out")
+
+def firestore_call(fn, *args, **kwargs):
+    """Runs one Firestore RPC (ref.get, ref.update, batch.commit, ...) through the breaker with the standard deadline."""
+    return firestore_breaker.call(fn, *args, timeout=FIRESTORE_TIMEOUT_SECONDS, **kwargs)
+
+def firestore_stream(query):
+    """Reads every result of `query` through the breaker with the standard deadline."""
+    return firestore_breaker.call(lambda: list(query.stream(timeout=FIRESTORE_TIMEOUT_SECONDS)))
+
+_fan_out_executor = None
+_fan_out_executor_pid = None
+
+def fan_out(calls):
+    """
+    Runs independent reads at the same time. `calls` maps a name to
+    (fn, *args); returns a dict of name -> result. The first error is raised
+    once every call has finished.
+    """
+    global _fan_out_executor, _fan_out_executor_pid
+    with _background_lock:
+        # Separate from the hedge pool: fanned-out calls may hedge themselves
+        if _fan_out_executor is None or _fan_out_executor_pid != os.getpid():
+            _fan_out_executor = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix="fan-out")
+            _fan_out_executor_pid = os.getpid()
+
+    futures = {name: _fan_out_executor.submit(call[0], *call[1:]) for name, call in calls.items()}
+    wait(futures.values())
+    for future in futures.values():
+        if future.exception() is not None:
+            raise future.exception()
+    return {name: future.result() for name, future in futures.items()}
+
 # ===================================================================
 # --- NOTIFICATION & EMAIL HELPER FUNCTIONS ---
 # ===================================================================
@@ -49,25 +407,44 @@ def send_email(to_email, to_name, subject, html_content):
         subject=subject,
         html_content=html_content
     )
+    # Emails are non-critical: while Brevo is failing, park them instead of waiting on it
+    if not brevo_breaker.allow():
+        print(f"Brevo circuit open. Deferring email to {to_email}.")
+        brevo_breaker.defer(send_email, to_email, to_name, subject, html_content)
+        return False
     try:
-        api_response = api_instance.send_transac_email(send_smtp_email)
+        api_response = api_instance.send_transac_email(send_smtp_email, _request_timeout=BREVO_TIMEOUT_SECONDS)
+        brevo_breaker.record_success()
         print(f"Email sent successfully to {to_email}. Response: {api_response.message_id}")
         return True
     except ApiException as e:
+        # Only server-side errors and rate limits count against Brevo's health
+        if e.status is None or e.status >= 500 or e.status == 429:
+            brevo_breaker.record_failure()
+        else:
+            brevo_breaker.record_success()
         print(f"Exception when calling TransactionalEmailsApi->send_transac_email: {e}")
         return False
+    except Exception as e:
+        brevo_breaker.record_failure()
+        print(f"Error sending email to {to_email}: {e}")
+        return False
 
 def create_notification(user_id, message, link):
     """Creates a new notification document in Firestore for a user."""
+    notification = {
+        "userId": user_id,
+        "message": message,
+        "read": False,
+        "createdAt": firestore.SERVER_TIMESTAMP,
+        "link": link
+    }
     try:
-        db.collection('notifications').add({
-            "userId": user_id,
-            "message": message,
-            "read": False,
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "link": link
-        })
+        firestore_breaker.call(db.collection('notifications').add, notification, timeout=FIRESTORE_TIMEOUT_SECONDS)
         print(f"Notification created for user {user_id}.")
+    except DependencyUnavailable:
+        print(f"Firestore circuit open. Deferring notification for user {user_id}.")
+        firestore_breaker.defer(create_notification, user_id, message, link)
     except Exception as e:
         print(f"Error creating notification: {e}")
 
@@ -79,13 +456,145 @@ def upload_file_to_storage(file, uid, file_name_prefix):
     """Uploads a file to Firebase Storage and returns its public URL."""
     if not file:
         return None
-    file_path = f"uploads/{uid}/{file_name_prefix}-{file.filename}"
-    blob = bucket.blob(file_path)
+    # A fresh folder per upload: a retry with the same file name must never
+    # overwrite (or, if it fails, delete) the object an earlier record uses
+    file_path = f"uploads/{uid}/{uuid.uuid4().hex}/{file_name_prefix}-{file.filename}"
+    # Without a chunk size the client library buffers up to 100 MB per request
+    blob = bucket.blob(file_path, chunk_size=STORAGE_UPLOAD_CHUNK_SIZE)
     blob.content_type = file.content_type
-    blob.upload_from_file(file.stream)
-    blob.make_public()
+
+    def upload():
+        blob.upload_from_file(file.stream, timeout=STORAGE_TIMEOUT_SECONDS)
+        blob.make_public(timeout=STORAGE_TIMEOUT_SECONDS)
+
+    storage_breaker.call(upload)
+    # Remembered so they can be deleted if the request fails after this point
+    g.setdefault("uploaded_blobs", []).append(blob)
     return blob.public_url
 
+def _delete_blobs(blobs):
+    for blob in blobs:
+        try:
+            blob.delete(timeout=STORAGE_TIMEOUT_SECONDS)
+            print(f"Deleted orphaned upload {blob.name}.")
+        except Exception as e:
+            print(f"Warning: Failed to delete orphaned upload {blob.name}: {e}")
+
+@app.after_request
+def delete_uploads_of_failed_request(response):
+    """
+    Files are uploaded as each part arrives, before the rest of the request
+    is validated. If the request ends in an error, nothing will point at
+    them, so they are removed.
+    """
+    blobs = g.pop("uploaded_blobs", None)
+    if blobs and response.status_code >= 400:
+        submit_background(_delete_blobs, blobs)
+    return response
+
+@app.teardown_request
+def delete_uploads_of_crashed_request(error):
+    # after_request doesn't run for an unhandled exception
+    blobs = g.pop("uploaded_blobs", None)
+    if blobs and error is not None:
+        submit_background(_delete_blobs, blobs)
+
+class UploadRejected(Exception):
+    """Raised when a multipart upload breaks a size limit or is malformed."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def parse_streaming_multipart(on_file):
+    """
+    Parses the multipart body straight off the socket instead of through
+    request.files. Each file part is spooled (in memory up to
+    UPLOAD_SPOOL_THRESHOLD, then a temp file) and handed to
+    `on_file(field_name, file_storage, fields)` as soon as that part ends, so
+    uploads start before the rest of the body has arrived and worker memory
+    stays flat. Returns (fields, results), where results maps each file field
+    to whatever `on_file` returned for it.
+    """
+    if request.content_length is not None and request.content_length > UPLOAD_MAX_REQUEST_BYTES:
+        raise UploadRejected("Upload is too large", 413)
+
+    mimetype, options = parse_options_header(request.headers.get("Content-Type", ""))
+    boundary = options.get("boundary")
+    if mimetype != "multipart/form-data" or not boundary:
+        raise UploadRejected("Expected a multipart/form-data body")
+
+    decoder = MultipartDecoder(boundary.encode("latin-1"), max_form_memory_size=UPLOAD_MAX_FIELD_BYTES)
+    fields = MultiDict()
+    results = MultiDict()
+    total_bytes = 0
+    field_bytes = 0
+    current = None # The part being received: ("field", name, [chunks]) or ("file", name, spool, FileStorage)
+
+    try:
+        while True:
+            chunk = request.stream.read(UPLOAD_CHUNK_SIZE)
+            total_bytes += len(chunk)
+            if total_bytes > UPLOAD_MAX_REQUEST_BYTES:
+                raise UploadRejected("Upload is too large", 413)
+            decoder.receive_data(chunk or None)
+
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, Field):
+                    current = ("field", event.name, [])
+                elif isinstance(event, File):
+                    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_THRESHOLD)
+                    file_storage = FileStorage(
+                        stream=spool,
+                        filename=event.filename,
+                        name=event.name,
+                        content_type=event.headers.get("Content-Type")
+                    )
+                    current = ("file", event.name, spool, file_storage)
+                elif isinstance(event, Data) and current is not None:
+                    if current[0] == "field":
+                        field_bytes += len(event.data)
+                        if field_bytes > UPLOAD_MAX_FIELD_BYTES:
+                            raise UploadRejected("Form fields are too large", 413)
+                        current[2].append(event.data)
+                        if not event.more_data:
+                            fields.add(current[1], b"".join(current[2]).decode("utf-8", "replace"))
+                            current = None
+                    else:
+                        spool = current[2]
+                        spool.write(event.data)
+                        if spool.tell() > UPLOAD_MAX_FILE_BYTES:
+                            raise UploadRejected(f"File '{current[3].filename}' is larger than {UPLOAD_MAX_FILE_BYTES / (1024 * 1024):g} MB", 413)
+                        if not event.more_data:
+                            spool.seek(0)
+                            try:
+                                if current[3].filename:
+                                    results.add(current[1], on_file(current[1], current[3], fields))
+                            finally:
+                                spool.close()
+                            current = None
+                event = decoder.next_event()
+
+            if isinstance(event, Epilogue) or not chunk:
+                break
+    except RequestEntityTooLarge:
+        raise UploadRejected("Upload is too large", 413)
+    except ValueError as e:
+        # The decoder raises ValueError for malformed bodies
+        raise UploadRejected(f"Malformed upload: {e}")
+    finally:
+        if current is not None and current[0] == "file":
+            current[2].close()
+
+    return fields, results
+
+def _find_first_doc(collection_name, field, value):
+    """Returns the first document where `field == value`, or None."""
+    query = db.collection(collection_name).where(field, "==", value).limit(1)
+    docs = list(query.stream(timeout=FIRESTORE_TIMEOUT_SECONDS))
+    return docs[0] if docs else None
+
 def get_user_wallet_by_national_id(national_id):
     """
     Finds a user by their idNumber and returns their walletAddress.
@@ -93,16 +602,12 @@ def get_user_wallet_by_national_id(national_id):
     if not national_id:
         return None
         
-    users_ref = db.collection("users")
-    query = users_ref.where("idNumber", "==", national_id).limit(1)
-    results = query.stream()
-    
-    user_docs = list(results)
+    user_doc = hedged_read(_find_first_doc, "users", "idNumber", national_id)
     
-    if len(user_docs) == 0:
+    if user_doc is None:
         return None # User not found
         
-    user_data = user_docs[0].to_dict()
+    user_data = user_doc.to_dict()
     return user_data.get("walletAddress") # Returns wallet address or None
 
 def get_property_token_id(parcel_number):
@@ -112,16 +617,12 @@ def get_property_token_id(parcel_number):
     if not parcel_number:
         return None
     
-    props_ref = db.collection("properties")
-    query = props_ref.where("parcelNumber", "==", parcel_number).limit(1)
-    results = query.stream()
-    prop_docs = list(results)
+    entry = get_parcel_entry(parcel_number)
     
-    if len(prop_docs) == 0:
+    if entry is None or entry.get("status") != "approved":
         return None # Property not found or not approved
         
-    prop_data = prop_docs[0].to_dict()
-    return prop_data.get("tokenId") 
+    return entry.get("tokenId") 
 
 def get_user_uid_by_national_id(national_id):
     """
@@ -129,20 +630,1469 @@ def get_user_uid_by_national_id(national_id):
     """
     if not national_id:
         return None
-    users_ref = db.collection("users")
-    query = users_ref.where("idNumber", "==", national_id).limit(1)
-    results = query.stream()
-    user_docs = list(results)
+    user_doc = hedged_read(_find_first_doc, "users", "idNumber", national_id)
     
-    if len(user_docs) == 0:
+    if user_doc is None:
         return None # User not found
         
-    return user_docs[0].id
+    return user_doc.id
+
+# ===================================================================
+# --- PARCEL INDEX HELPER FUNCTIONS ---
+# ===================================================================
+
+# parcelIndex/{parcel} holds the current tokenId, owner and status of a parcel,
+# so lookups are a single-key read. parcelIndex/{parcel}/timeline is an
+# append-only history of submissions, reviews and transfers.
+_parcel_cache = OrderedDict()
+_parcel_cache_lock = threading.Lock()
+
+def _parcel_index_id(parcel_number):
+    # Parcel numbers often contain '/', which Firestore doesn't allow in IDs
+    return quote(parcel_number, safe="")
+
+def _parcel_cache_get(parcel_number):
+    with _parcel_cache_lock:
+        cached = _parcel_cache.get(parcel_number)
+        if cached is None:
+            return None
+        expires_at, entry = cached
+        if expires_at < time.monotonic():
+            del _parcel_cache[parcel_number]
+            return None
+        _parcel_cache.move_to_end(parcel_number)
+        return entry
+
+def _parcel_cache_put(parcel_number, entry):
+    with _parcel_cache_lock:
+        _parcel_cache[parcel_number] = (time.monotonic() + PARCEL_CACHE_TTL_SECONDS, entry)
+        _parcel_cache.move_to_end(parcel_number)
+        while len(_parcel_cache) > PARCEL_CACHE_SIZE:
+            _parcel_cache.popitem(last=False)
+
+def _parcel_cache_invalidate(parcel_number):
+    with _parcel_cache_lock:
+        _parcel_cache.pop(parcel_number, None)
+
+def _get_doc(collection_name, doc_id):
+    """Single-key read. Returns the snapshot, or None if it doesn't exist."""
+    doc = db.collection(collection_name).document(doc_id).get(timeout=FIRESTORE_TIMEOUT_SECONDS)
+    return doc if doc.exists else None
+
+def _find_approved_property(parcel_number):
+    query = (db.collection("properties")
+             .where("parcelNumber", "==", parcel_number)
+             .where("status", "==", "approved")
+             .limit(1))
+    docs = list(query.stream(timeout=FIRESTORE_TIMEOUT_SECONDS))
+    return docs[0] if docs else None
+
+def get_parcel_entry(parcel_number):
+    """
+    Returns the parcel index entry for `parcel_number` (LRU first, then one
+    document read), or None if the parcel isn't registered.
+    """
+    entry = _parcel_cache_get(parcel_number)
+    if entry is not None:
+        return entry
+
+    index_doc = hedged_read(_get_doc, "parcelIndex", _parcel_index_id(parcel_number))
+    entry = index_doc.to_dict() if index_doc else None
+
+    if entry is None:
+        # Approved before the index existed: look it up the old way once and index it
+        prop_doc = hedged_read(_find_approved_property, parcel_number)
+        if prop_doc is None:
+            return None
+        prop_data = prop_doc.to_dict()
+        entry = {
+            "parcelNumber": parcel_number,
+            "propertyId": prop_doc.id,
+            "ownerUid": prop_data.get("uid"),
+            "ownerWalletAddress": prop_data.get("ownerWalletAddress"),
+            "status": "approved",
+            "tokenId": prop_data.get("tokenId"),
+        }
+        update_parcel_index(parcel_number, entry)
+
+    elif entry.get("status") == "approved" and entry.get("tokenId") is None and entry.get("propertyId"):
+        # Minting writes tokenId onto the property from the browser, so pick it up from there
+        prop_doc = hedged_read(_get_doc, "properties", entry["propertyId"])
+        token_id = prop_doc.to_dict().get("tokenId") if prop_doc else None
+        if token_id is not None:
+            entry["tokenId"] = token_id
+            update_parcel_index(parcel_number, {"tokenId": token_id}, {"type": "minted", "tokenId": token_id})
+
+    # Approved but not minted yet: keep re-checking, so a fresh mint shows up straight away
+    if not (entry.get("status") == "approved" and entry.get("tokenId") is None):
+        _parcel_cache_put(parcel_number, entry)
+    return entry
+
+def update_parcel_index(parcel_number, fields, event=None, keep_if_approved=False):
+    """
+    Merges `fields` into the parcel's index entry and appends `event` to its
+    timeline. With `keep_if_approved`, `fields` are skipped for a parcel that
+    is already approved (the event is still recorded). The index is derived
+    data, so failures are logged, not raised.
+    """
+    if not parcel_number:
+        return
+    try:
+        if keep_if_approved:
+            existing_entry = get_parcel_entry(parcel_number)
+            if existing_entry and existing_entry.get("status") == "approved":
+                fields = {}
+        index_ref = db.collection("parcelIndex").document(_parcel_index_id(parcel_number))
+        batch = db.batch()
+        batch.set(index_ref, {**fields, "parcelNumber": parcel_number, "updatedAt": firestore.SERVER_TIMESTAMP}, merge=True)
+        if event:
+            batch.set(index_ref.collection("timeline").document(), {**event, "timestamp": firestore.SERVER_TIMESTAMP})
+        firestore_breaker.call(batch.commit, timeout=FIRESTORE_TIMEOUT_SECONDS)
+    except Exception as e:
+        print(f"Warning: Failed to update parcel index for {parcel_number}: {e}")
+    finally:
+        _parcel_cache_invalidate(parcel_number)
+
+def get_parcel_timeline(parcel_number, limit=100):
+    """Returns the parcel's timeline events, oldest first."""
+    timeline_ref = (db.collection("parcelIndex")
+                    .document(_parcel_index_id(parcel_number))
+                    .collection("timeline")
+                    .order_by("timestamp")
+                    .limit(limit))
+    return [event.to_dict() for event in firestore_stream(timeline_ref)]
+
+# ===================================================================
+# --- REVIEW QUEUE (LEASED CLAIMS) ---
+# ===================================================================
+
+# Items waiting for an admin: the collection they live in and the status
+# that means "needs review". Claims set assignedAdmin (what the admin pages
+# already filter on) plus a lease that expires unless it is renewed.
+REVIEW_QUEUES = {
+    "transactions": {"collection": "transactions", "status": "Under Review"},
+    "properties": {"collection": "pendingProperties", "status": "pending"},
+    "advocateApplications": {"collection": "advocateApplications", "status": "pending"},
+}
+
+def lease_held_by_other(item_data, admin_uid, now=None):
+    """
+    True if another admin holds a live lease on the item. Review actions
+    check this so only the lease holder can act. Items assigned before
+    leases existed have no expiry and stay with that admin.
+    """
+    if item_data.get("assignedAdmin") in (None, admin_uid):
+        return False
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    lease_expires_at = item_data.get("leaseExpiresAt")
+    return lease_expires_at is None or lease_expires_at >= now
+
+def _lease_is_free(item_data, queue, admin_uid, now):
+    if item_data.get("status") != queue["status"]:
+        return False
+    return not lease_held_by_other(item_data, admin_uid, now)
+
+@firestore.transactional
+def _claim_item_in_transaction(transaction, item_ref, queue, admin_uid, now):
+    """Leases one item to `admin_uid` if nobody else holds it. Returns the item data or None."""
+    snapshot = item_ref.get(transaction=transaction, timeout=FIRESTORE_TIMEOUT_SECONDS)
+    if not snapshot.exists:
+        return None
+    item_data = snapshot.to_dict()
+    if not _lease_is_free(item_data, queue, admin_uid, now):
+        return None
+
+    lease = {
+        "assignedAdmin": admin_uid,
+        "leaseExpiresAt": now + datetime.timedelta(seconds=QUEUE_LEASE_SECONDS),
+        "leaseClaimedAt": now
+    }
+    transaction.update(item_ref, lease)
+    return {**item_data, **lease}
+
+@firestore.transactional
+def _renew_lease_in_transaction(transaction, item_ref, admin_uid, now):
+    snapshot = item_ref.get(transaction=transaction, timeout=FIRESTORE_TIMEOUT_SECONDS)
+    if not snapshot.exists or snapshot.to_dict().get("assignedAdmin") != admin_uid:
+        return None
+    lease_expires_at = now + datetime.timedelta(seconds=QUEUE_LEASE_SECONDS)
+    transaction.update(item_ref, {"leaseExpiresAt": lease_expires_at})
+    return lease_expires_at
+
+@firestore.transactional
+def _release_lease_in_transaction(transaction, item_ref, admin_uid):
+    snapshot = item_ref.get(transaction=transaction, timeout=FIRESTORE_TIMEOUT_SECONDS)
+    if not snapshot.exists or snapshot.to_dict().get("assignedAdmin") != admin_uid:
+        return False
+    transaction.update(item_ref, {
+        "assignedAdmin": None,
+        "leaseExpiresAt": firestore.DELETE_FIELD,
+        "leaseClaimedAt": firestore.DELETE_FIELD
+    })
+    return True
+
+def claim_review_items(queue_name, admin_uid, count=1, item_ids=None):
+    """
+    Leases up to `count` free items from a review queue to `admin_uid`, or
+    exactly `item_ids` if given. Each claim is its own Firestore transaction,
+    so two admins can never end up holding the same item.
+    """
+    queue = REVIEW_QUEUES[queue_name]
+    collection_ref = db.collection(queue["collection"])
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    if item_ids:
+        candidate_refs = [collection_ref.document(item_id) for item_id in item_ids]
+        count = len(item_ids)
+    else:
+        # Unassigned items, plus items whose lease ran out without a renewal
+        scan_limit = count * QUEUE_SCAN_FACTOR
+        unassigned = (collection_ref
+                      .where("status", "==", queue["status"])
+                      .where("assignedAdmin", "==", None)
+                      .limit(scan_limit))
+        expired = (collection_ref
+                   .where("status", "==", queue["status"])
+                   .where("leaseExpiresAt", "<", now)
+                   .limit(scan_limit))
+        candidate_refs = [snap.reference for snap in firestore_stream(unassigned)]
+        candidate_refs += [snap.reference for snap in firestore_stream(expired)]
+        # Admins claiming at the same moment start from different items
+        random.shuffle(candidate_refs)
+
+    claimed = []
+    for item_ref in candidate_refs:
+        if len(claimed) >= count:
+            break
+        item_data = firestore_breaker.call(_claim_item_in_transaction, db.transaction(), item_ref, queue, admin_uid, now)
+        if item_data is not None:
+            claimed.append({"id": item_ref.id, **item_data})
+    return claimed
+
+def renew_review_leases(queue_name, admin_uid, item_ids):
+    """Heartbeat: extends the admin's leases. Returns {itemId: newExpiry} for leases still held."""
+    collection_ref = db.collection(REVIEW_QUEUES[queue_name]["collection"])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    renewed = {}
+    for item_id in item_ids:
+        lease_expires_at = firestore_breaker.call(_renew_lease_in_transaction, db.transaction(), collection_ref.document(item_id), admin_uid, now)
+        if lease_expires_at is not None:
+            renewed[item_id] = lease_expires_at
+    return renewed
+
+def release_review_items(queue_name, admin_uid, item_ids):
+    """Hands the admin's items back to the queue. Returns the released IDs."""
+    collection_ref = db.collection(REVIEW_QUEUES[queue_name]["collection"])
+    return [
+        item_id for item_id in item_ids
+        if firestore_breaker.call(_release_lease_in_transaction, db.transaction(), collection_ref.document(item_id), admin_uid)
+    ]
+
+# ===================================================================
+# --- SEARCH INDEX ---
+# ===================================================================
+
+# What gets indexed for each kind of record, and how it is displayed.
+SEARCH_SOURCES = {
+    "properties": {
+        "collection": "properties",
+        "fields": ["parcelNumber", "location"],
+        "title": lambda d: d.get("parcelNumber"),
+        "subtitle": lambda d: d.get("location"),
+    },
+    "pendingProperties": {
+        "collection": "pendingProperties",
+        "fields": ["parcelNumber", "location"],
+        "title": lambda d: d.get("parcelNumber"),
+        "subtitle": lambda d: d.get("location"),
+    },
+    "users": {
+        "collection": "users",
+        "fields": ["firstName", "lastName", "email", "idNumber"],
+        "title": lambda d: " ".join(filter(None, [d.get("firstName"), d.get("lastName")])) or d.get("email"),
+        "subtitle": lambda d: d.get("email"),
+    },
+    "transactions": {
+        "collection": "transactions",
+        "fields": ["parcelNumber", "location", "buyer.name", "seller.name", "advocate.name"],
+        "title": lambda d: d.get("parcelNumber"),
+        "subtitle": lambda d: f"{_get_dotted(d, 'seller.name') or '?'} -> {_get_dotted(d, 'buyer.name') or '?'}",
+    },
+}
+
+# Kinds only admins may search freely. Others can only resolve a user by
+# exact national ID, as the rest of the API does.
+SEARCH_ADMIN_ONLY_KINDS = {"users"}
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+def _search_tokens(text):
+    """Lowercased word tokens, plus the whole value with separators removed
+    (so 'nairobi/block1' matches the parcel 'Nairobi/Block1/123')."""
+    text = str(text).lower()
+    tokens = {token for token in _TOKEN_SPLIT.split(text) if token}
+    joined = _TOKEN_SPLIT.sub("", text)
+    if joined:
+        tokens.add(joined)
+    return tokens
+
+def _search_record(kind, doc_id, data):
+    """The display record returned for a search hit."""
+    source = SEARCH_SOURCES[kind]
+    return {
+        "kind": kind,
+        "id": doc_id,
+        "title": source["title"](data),
+        "subtitle": source["subtitle"](data),
+        "status": data.get("status"),
+    }
+
+def _trigrams(token):
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """
+    In-process inverted index. Tokens map to the records containing them; a
+    trigram index over the token vocabulary gives typo-tolerant matches, and
+    a sorted token list gives prefix matches.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records = {}        # (kind, id) -> display record
+        self._record_tokens = {}  # (kind, id) -> tokens
+        self._postings = {}       # token -> {(kind, id)}
+        self._trigram_tokens = {} # trigram -> {token}
+        self._sorted_tokens = []
+        self._sorted_dirty = False
+
+    def __len__(self):
+        return len(self._records)
+
+    def upsert(self, kind, doc_id, data):
+        source = SEARCH_SOURCES[kind]
+        tokens = set()
+        for field in source["fields"]:
+            value = _get_dotted(data, field)
+            if value:
+                tokens |= _search_tokens(value)
+        self._add(kind, doc_id, _search_record(kind, doc_id, data), tokens)
+
+    def _add(self, kind, doc_id, record, tokens):
+        with self._lock:
+            self._remove_locked((kind, doc_id))
+            self._records[(kind, doc_id)] = record
+            self._record_tokens[(kind, doc_id)] = tokens
+            for token in tokens:
+                if token not in self._postings:
+                    self._postings[token] = set()
+                    for trigram in _trigrams(token):
+                        self._trigram_tokens.setdefault(trigram, set()).add(token)
+                    self._sorted_dirty = True
+                self._postings[token].add((kind, doc_id))
+
+    def remove(self, kind, doc_id):
+        with self._lock:
+            self._remove_locked((kind, doc_id))
+
+    def to_snapshot(self):
+        """Rows of [kind, id, record, tokens], as written to SEARCH_SNAPSHOT_PATH."""
+        with self._lock:
+            return [[kind, doc_id, record, sorted(self._record_tokens[(kind, doc_id)])]
+                    for (kind, doc_id), record in self._records.items()]
+
+    @classmethod
+    def from_snapshot(cls, rows):
+        index = cls()
+        for kind, doc_id, record, tokens in rows:
+            index._add(kind, doc_id, record, set(tokens))
+        return index
+
+    def _remove_locked(self, key):
+        self._records.pop(key, None)
+        for token in self._record_tokens.pop(key, ()):
+            keys = self._postings.get(token)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._postings[token]
+                for trigram in _trigrams(token):
+                    vocabulary = self._trigram_tokens.get(trigram)
+                    if vocabulary is not None:
+                        vocabulary.discard(token)
+                        if not vocabulary:
+                            del self._trigram_tokens[trigram]
+                self._sorted_dirty = True
+
+    def _term_matches(self, term):
+        """Returns {token: score} for every indexed token that matches `term`."""
+        if self._sorted_dirty:
+            self._sorted_tokens = sorted(self._postings)
+            self._sorted_dirty = False
+
+        matches = {}
+        # Prefix matches (capped so a one-letter query stays cheap)
+        start = bisect.bisect_left(self._sorted_tokens, term)
+        for token in self._sorted_tokens[start:start + 200]:
+            if not token.startswith(term):
+                break
+            matches[token] = 3.0 if token == term else 2.0
+
+        # Fuzzy matches through shared trigrams
+        if len(term) >= 3:
+            term_trigrams = _trigrams(term)
+            shared_counts = {}
+            for trigram in term_trigrams:
+                for token in self._trigram_tokens.get(trigram, ()):
+                    shared_counts[token] = shared_counts.get(token, 0) + 1
+            for token, shared in shared_counts.items():
+                # Jaccard similarity (a padded token of length n has n trigrams)
+                similarity = shared / (len(term_trigrams) + len(token) - shared)
+                if similarity >= SEARCH_FUZZY_THRESHOLD and token not in matches:
+                    matches[token] = similarity
+        return matches
+
+    def search(self, query, kinds=None):
+        """Ranked records matching every term of `query` (best first)."""
+        terms = [term for term in _TOKEN_SPLIT.split(str(query).lower()) if term]
+        if not terms:
+            return []
+
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for token, score in self._term_matches(term).items():
+                    for key in self._postings[token]:
+                        if score > term_scores.get(key, 0):
+                            term_scores[key] = score
+                # Every term has to match something
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {key: scores[key] + score for key, score in term_scores.items() if key in scores}
+                if not scores:
+                    return []
+
+            results = [
+                {**self._records[key], "score": round(score, 3)}
+                for key, score in scores.items()
+                if kinds is None or key[0] in kinds
+            ]
+        results.sort(key=lambda r: (-r["score"], str(r["title"] or "")))
+        return results
+
+def write_search_snapshot(index):
+    """Replaces the snapshot file in one step, so workers never read a half-written one."""
+    rows = index.to_snapshot()
+    directory = os.path.dirname(os.path.abspath(SEARCH_SNAPSHOT_PATH))
+    with tempfile.NamedTemporaryFile("wb", dir=directory, suffix=".tmp", delete=False) as tmp:
+        tmp.write(gzip.compress(json.dumps(rows, default=str).encode("utf-8")))
+    os.replace(tmp.name, SEARCH_SNAPSHOT_PATH)
+    print(f"Search index snapshot written with {len(rows)} records.")
+
+def run_search_indexer():
+    """
+    Keeps the search index current and persists it for the web workers
+    (long-running; run exactly one). Each source collection gets a snapshot
+    listener: the first snapshot is the initial load, later ones carry only
+    the changed documents. Once every source has loaded, the index is
+    written out whenever it has changed, at most every
+    SEARCH_SNAPSHOT_WRITE_SECONDS.
+    """
+    index = SearchIndex()
+    loading = set(SEARCH_SOURCES)
+    state = {"dirty": False}
+    state_lock = threading.Lock()
+    watches = []
+
+    def make_callback(kind):
+        def on_snapshot(col_snapshot, changes, read_time):
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    index.remove(kind, change.document.id)
+                else:
+                    index.upsert(kind, change.document.id, change.document.to_dict())
+            with state_lock:
+                loading.discard(kind)
+                state["dirty"] = True
+        return on_snapshot
+
+    for kind, source in SEARCH_SOURCES.items():
+        watches.append(db.collection(source["collection"]).on_snapshot(make_callback(kind)))
+
+    print(f"Search indexer: watching {', '.join(SEARCH_SOURCES)} into {SEARCH_SNAPSHOT_PATH}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(SEARCH_SNAPSHOT_WRITE_SECONDS)
+            with state_lock:
+                if loading or not state["dirty"]:
+                    continue
+                state["dirty"] = False
+            write_search_snapshot(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for watch in watches:
+            watch.unsubscribe()
+
+# This worker's copy of the index, loaded from the indexer's snapshot file
+_search_index = None
+_search_snapshot_mtime = None
+_search_checked_at = 0.0
+_search_reloading = False
+_search_lock = threading.Lock()
+
+def _load_search_snapshot():
+    """Loads the snapshot file if it changed since this worker last read it."""
+    global _search_index, _search_snapshot_mtime
+    try:
+        mtime = os.stat(SEARCH_SNAPSHOT_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return
+    if mtime == _search_snapshot_mtime:
+        return
+    with open(SEARCH_SNAPSHOT_PATH, "rb") as f:
+        rows = json.loads(gzip.decompress(f.read()).decode("utf-8"))
+    _search_index = SearchIndex.from_snapshot(rows)
+    _search_snapshot_mtime = mtime
+
+def _reload_search_snapshot():
+    global _search_reloading
+    try:
+        _load_search_snapshot()
+    except Exception as e:
+        print(f"Warning: Failed to reload search index snapshot: {e}")
+    finally:
+        _search_reloading = False
+
+def get_search_index():
+    """
+    Returns this worker's copy of the search index, or None until the
+    indexer has written its first snapshot (the caller answers 503). Looks
+    for a newer snapshot at most every SEARCH_SNAPSHOT_CHECK_SECONDS; the
+    first load happens inline, later ones in the background while searches
+    keep using the current copy.
+    """
+    global _search_checked_at, _search_reloading
+    with _search_lock:
+        if time.monotonic() - _search_checked_at < SEARCH_SNAPSHOT_CHECK_SECONDS:
+            return _search_index
+        _search_checked_at = time.monotonic()
+        if _search_index is None:
+            _load_search_snapshot()
+            return _search_index
+        if _search_reloading:
+            return _search_index
+        _search_reloading = True
+    submit_background(_reload_search_snapshot)
+    return _search_index
+
+def _apply_search_op(op):
+    # The indexer picks up every write for the next snapshot; this just makes
+    # the writing worker's own results current straight away
+    index = _search_index
+    if index is not None:
+        op(index)
+
+def search_index_upsert(kind, doc_id, data):
+    """Adds or refreshes one record in this worker's search index."""
+    _apply_search_op(lambda index: index.upsert(kind, doc_id, data))
+
+def search_index_remove(kind, doc_id):
+    """Drops one record from this worker's search index."""
+    _apply_search_op(lambda index: index.remove(kind, doc_id))
+
+# ===================================================================
+# --- TRANSACTION DETAIL (one round trip for the stage pages) ---
+# ===================================================================
+
+# Only these profile fields are shown to the other parties on a deal
+PARTY_PROFILE_FIELDS = ("firstName", "lastName", "email", "phone", "photoURL", "walletAddress")
+PREVIEWABLE_TYPES = ("image/", "application/pdf", "text/plain")
+
+# transactionId -> (expires_at, status, related). `related` (parties, property,
+# logs) only changes when the deal moves stage, so it is reused until the TTL
+# runs out or the transaction's status differs from the one it was built for.
+_tx_detail_cache = OrderedDict()
+_tx_detail_cache_lock = threading.Lock()
+
+def _tx_detail_cache_get(transaction_id, status):
+    with _tx_detail_cache_lock:
+        cached = _tx_detail_cache.get(transaction_id)
+        if cached is None:
+            return None
+        expires_at, cached_status, related = cached
+        if expires_at < time.monotonic() or cached_status != status:
+            del _tx_detail_cache[transaction_id]
+            return None
+        _tx_detail_cache.move_to_end(transaction_id)
+        return related
+
+def _tx_detail_cache_put(transaction_id, status, related):
+    with _tx_detail_cache_lock:
+        _tx_detail_cache[transaction_id] = (time.monotonic() + TX_DETAIL_CACHE_TTL_SECONDS, status, related)
+        _tx_detail_cache.move_to_end(transaction_id)
+        while len(_tx_detail_cache) > TX_DETAIL_CACHE_SIZE:
+            _tx_detail_cache.popitem(last=False)
+
+def invalidate_transaction_detail(transaction_id):
+    """Called after every stage transition this worker makes."""
+    with _tx_detail_cache_lock:
+        _tx_detail_cache.pop(transaction_id, None)
+
+def _load_party_profile(uid):
+    if not uid:
+        return None
+    user_doc = hedged_read(_get_doc, "users", uid)
+    if user_doc is None:
+        return None
+    user_data = user_doc.to_dict()
+    return {"uid": uid, **{key: user_data[key] for key in PARTY_PROFILE_FIELDS if key in user_data}}
+
+def _load_detail_property(parcel_number):
+    if not parcel_number:
+        return None
+    entry = get_parcel_entry(parcel_number)
+    if entry is None:
+        return None
+    prop_doc = hedged_read(_get_doc, "properties", entry["propertyId"]) if entry.get("propertyId") else None
+    prop_data = prop_doc.to_dict() if prop_doc else {}
+    return {
+        **entry,
+        "location": prop_data.get("location"),
+        "address": prop_data.get("address"),
+        "approvedAt": prop_data.get("approvedAt"),
+    }
+
+def _load_transaction_logs(transaction_id):
+    # Equality-only query (no composite index needed); a deal only has a handful of log entries
+    query = db.collection("logs").where("relatedTransaction", "==", transaction_id)
+    logs = [{"id": snap.id, **snap.to_dict()} for snap in firestore_stream(query)]
+    logs.sort(key=lambda log: log.get("timestamp") or datetime.datetime.min.replace(tzinfo=datetime.timezone.utc), reverse=True)
+    return logs[:TX_DETAIL_LOG_LIMIT]
+
+def _document_with_preview(document):
+    """Adds contentType and, for types a browser can show inline, a previewUrl."""
+    content_type = mimetypes.guess_type(document.get("name") or "")[0] or mimetypes.guess_type((document.get("url") or "").split("?")[0])[0]
+    previewable = bool(content_type) and content_type.startswith(PREVIEWABLE_TYPES)
+    return {
+        **document,
+        "contentType": content_type,
+        "previewUrl": document.get("url") if previewable else None,
+    }
+
+def get_transaction_detail(transaction_id, tx_data):
+    """
+    Builds the aggregated view of one transaction. Party profiles, the
+    property and recent logs are read in parallel, then cached per stage.
+    """
+    status = tx_data.get("status")
+    related = _tx_detail_cache_get(transaction_id, status)
+    if related is None:
+        related = fan_out({
+            "buyer": (_load_party_profile, (tx_data.get("buyer") or {}).get("uid")),
+            "seller": (_load_party_profile, (tx_data.get("seller") or {}).get("uid")),
+            "advocate": (_load_party_profile, (tx_data.get("advocate") or {}).get("uid")),
+            "property": (_load_detail_property, tx_data.get("parcelNumber")),
+            "logs": (_load_transaction_logs, transaction_id),
+        })
+        _tx_detail_cache_put(transaction_id, status, related)
+
+    return {
+        "transaction": {"id": transaction_id, **tx_data},
+        "parties": {role: related[role] for role in ("buyer", "seller", "advocate")},
+        "property": related["property"],
+        "documents": [_document_with_preview(document) for document in tx_data.get("advocateDocuments") or []],
+        "logs": related["logs"],
+    }
+
+# ===================================================================
+# --- CHANGE DATA CAPTURE -> LOCAL ANALYTICS STORE ---
+# ===================================================================
+
+# A single `flask --app app cdc` process tails Firestore with snapshot
+# listeners and applies every change to a local SQLite file. The report
+# endpoints only ever read that file, never Firestore.
+ANALYTICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    parcel_number TEXT,
+    status TEXT,
+    advocate_uid TEXT,
+    advocate_name TEXT,
+    created_at TEXT,
+    finalized_at TEXT,
+    removed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS transaction_stage_events (
+    transaction_id TEXT NOT NULL,
+    status TEXT,
+    observed_at TEXT NOT NULL,
+    backfilled INTEGER NOT NULL DEFAULT 0 -- 1 = seen during an initial sync, real transition time unknown
+);
+CREATE INDEX IF NOT EXISTS idx_stage_events_tx ON transaction_stage_events (transaction_id, observed_at);
+CREATE TABLE IF NOT EXISTS property_records (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    parcel_number TEXT,
+    uid TEXT,
+    status TEXT,
+    reviewed_by TEXT,
+    submitted_at TEXT,
+    approved_at TEXT,
+    removed_at TEXT,
+    PRIMARY KEY (collection, id)
+);
+CREATE TABLE IF NOT EXISTS advocate_applications (
+    id TEXT PRIMARY KEY,
+    uid TEXT,
+    status TEXT,
+    reviewed_by TEXT,
+    submitted_at TEXT,
+    removed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS logs (
+    id TEXT PRIMARY KEY,
+    message TEXT,
+    timestamp TEXT,
+    advocate_uid TEXT,
+    related_transaction TEXT,
+    property_id TEXT,
+    tx_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp);
+CREATE TABLE IF NOT EXISTS cdc_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _iso(value):
+    """Firestore timestamp -> ISO-8601 UTC string (what julianday() expects)."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.astimezone(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return None
+
+def open_analytics_db(read_only=False):
+    """Opens the analytics store. Readers open it read-only so they can never block the CDC writer."""
+    if read_only:
+        if not os.path.exists(ANALYTICS_DB_PATH):
+            return None
+        conn = sqlite3.connect(f"file:{ANALYTICS_DB_PATH}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(ANALYTICS_DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(ANALYTICS_SCHEMA)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _cdc_apply_transaction(conn, doc_id, data, backfilled, now):
+    if data is None:
+        conn.execute("UPDATE transactions SET removed_at = ? WHERE id = ?", (now, doc_id))
+        return
+    previous = conn.execute("SELECT status FROM transactions WHERE id = ?", (doc_id,)).fetchone()
+    conn.execute(
+        """INSERT INTO transactions (id, parcel_number, status, advocate_uid, advocate_name, created_at, finalized_at, removed_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+           ON CONFLICT(id) DO UPDATE SET parcel_number = excluded.parcel_number, status = excluded.status,
+               advocate_uid = excluded.advocate_uid, advocate_name = excluded.advocate_name,
+               created_at = excluded.created_at, finalized_at = excluded.finalized_at, removed_at = NULL""",
+        (doc_id, data.get("parcelNumber"), data.get("status"), _get_dotted(data, "advocate.uid"),
+         _get_dotted(data, "advocate.name"), _iso(data.get("createdAt")), _iso(data.get("finalizedAt")))
+    )
+    # Record every stage transition; a brand-new transaction's first stage starts at createdAt.
+    # Anything found in an initial sync (first run or a restart) happened at some
+    # unknown time while CDC wasn't watching, so it is flagged as backfilled.
+    if previous is None or previous["status"] != data.get("status"):
+        observed_at = now
+        if previous is None and not backfilled and _iso(data.get("createdAt")):
+            observed_at = _iso(data.get("createdAt"))
+        conn.execute(
+            "INSERT INTO transaction_stage_events (transaction_id, status, observed_at, backfilled) VALUES (?, ?, ?, ?)",
+            (doc_id, data.get("status"), observed_at, 1 if backfilled else 0)
+        )
+
+def _cdc_apply_property(collection_name):
+    def apply(conn, doc_id, data, backfilled, now):
+        if data is None:
+            conn.execute("UPDATE property_records SET removed_at = ? WHERE collection = ? AND id = ?", (now, collection_name, doc_id))
+            return
+        conn.execute(
+            """INSERT OR REPLACE INTO property_records
+               (collection, id, parcel_number, uid, status, reviewed_by, submitted_at, approved_at, removed_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)""",
+            (collection_name, doc_id, data.get("parcelNumber"), data.get("uid"), data.get("status"),
+             data.get("reviewedBy"), _iso(data.get("submittedAt")), _iso(data.get("approvedAt")))
+        )
+    return apply
+
+def _cdc_apply_advocate_application(conn, doc_id, data, backfilled, now):
+    if data is None:
+        conn.execute("UPDATE advocate_applications SET removed_at = ? WHERE id = ?", (now, doc_id))
+        return
+    conn.execute(
+        """INSERT OR REPLACE INTO advocate_applications (id, uid, status, reviewed_by, submitted_at, removed_at)
+           VALUES (?, ?, ?, ?, ?, NULL)""",
+        (doc_id, data.get("uid"), data.get("status"), data.get("reviewedBy"), _iso(data.get("submittedAt")))
+    )
+
+def _cdc_apply_log(conn, doc_id, data, backfilled, now):
+    if data is None:
+        return # Logs are append-only; a delete here means it was archived, keep it for reporting
+    conn.execute(
+        """INSERT OR REPLACE INTO logs (id, message, timestamp, advocate_uid, related_transaction, property_id, tx_hash)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (doc_id, data.get("message"), _iso(data.get("timestamp")), data.get("advocateUid"),
+         data.get("relatedTransaction"), data.get("propertyId"), data.get("txHash"))
+    )
+
+CDC_APPLIERS = {
+    "transactions": _cdc_apply_transaction,
+    "properties": _cdc_apply_property("properties"),
+    "pendingProperties": _cdc_apply_property("pendingProperties"),
+    "advocateApplications": _cdc_apply_advocate_application,
+    "logs": _cdc_apply_log,
+}
+
+def run_cdc():
+    """
+    Tails the reporting collections into the analytics store until stopped.
+    Removals are kept as removed_at (e.g. archived records still count).
+    Logs are append-only, so after the first sync only logs newer than the
+    last one stored are watched.
+    """
+    conn = open_analytics_db()
+    write_lock = threading.Lock()
+    watches = []
+
+    def make_callback(collection_name):
+        state = {"initial": True}
+
+        def on_snapshot(col_snapshot, changes, read_time):
+            now = _iso(datetime.datetime.now(datetime.timezone.utc))
+            apply = CDC_APPLIERS[collection_name]
+            with write_lock:
+                with conn:
+                    for change in changes:
+                        data = None if change.type.name == "REMOVED" else change.document.to_dict()
+                        apply(conn, change.document.id, data, state["initial"], now)
+            print(f"CDC: applied {len(changes)} change(s) to '{collection_name}'.")
+            state["initial"] = False
+
+        return on_snapshot
+
+    # Logs: page through anything not stored yet, then only watch what's newer
+    last_log = conn.execute("SELECT MAX(timestamp) FROM logs").fetchone()[0]
+    log_query = db.collection("logs").order_by("timestamp")
+    if last_log:
+        log_query = log_query.where("timestamp", ">", datetime.datetime.fromisoformat(last_log).replace(tzinfo=datetime.timezone.utc))
+    log_count = 0
+    with conn:
+        for snap in iter_export_snapshots(log_query):
+            _cdc_apply_log(conn, snap.id, snap.to_dict(), True, None)
+            log_count += 1
+    print(f"CDC: backfilled {log_count} log(s).")
+    last_log = conn.execute("SELECT MAX(timestamp) FROM logs").fetchone()[0]
+    since = (datetime.datetime.fromisoformat(last_log).replace(tzinfo=datetime.timezone.utc)
+             if last_log else datetime.datetime.now(datetime.timezone.utc))
+
+    for collection_name in CDC_APPLIERS:
+        query = db.collection(collection_name)
+        if collection_name == "logs":
+            query = query.where("timestamp", ">", since)
+        watches.append(query.on_snapshot(make_callback(collection_name)))
+
+    print(f"CDC: tailing {', '.join(CDC_APPLIERS)} into {ANALYTICS_DB_PATH}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for watch in watches:
+            watch.unsubscribe()
+        conn.close()
+
+# Parameterized reports. Queries take :start, :end, :advocate and :reviewer (NULL = no filter);
+# each uses only the ones that apply to it.
+ANALYTICS_REPORTS = {
+    # Average days spent in each transaction stage
+    "stage-durations": """
+        WITH ordered AS (
+            SELECT e.status, e.observed_at, e.backfilled,
+                   LEAD(e.observed_at) OVER (PARTITION BY e.transaction_id ORDER BY e.observed_at) AS next_at,
+                   LEAD(e.backfilled) OVER (PARTITION BY e.transaction_id ORDER BY e.observed_at) AS next_backfilled
+            FROM transaction_stage_events e
+            JOIN transactions t ON t.id = e.transaction_id
+            WHERE (:start IS NULL OR t.created_at >= :start)
+              AND (:end IS NULL OR t.created_at < :end)
+              AND (:advocate IS NULL OR t.advocate_uid = :advocate)
+        )
+        SELECT status,
+               COUNT(*) AS samples,
+               ROUND(AVG(julianday(next_at) - julianday(observed_at)), 3) AS avgDays,
+               ROUND(MIN(julianday(next_at) - julianday(observed_at)), 3) AS minDays,
+               ROUND(MAX(julianday(next_at) - julianday(observed_at)), 3) AS maxDays
+        FROM ordered
+        -- Both ends must have been seen live, or the duration is unknown
+        WHERE next_at IS NOT NULL AND backfilled = 0 AND next_backfilled = 0
+        GROUP BY status
+        ORDER BY avgDays DESC
+    """,
+    # Share of each advocate's transactions that ended up rejected
+    "advocate-rejection-rates": """
+        SELECT advocate_uid AS advocateUid,
+               MAX(advocate_name) AS advocateName,
+               COUNT(*) AS total,
+               SUM(status = 'Rejected') AS rejected,
+               SUM(status = 'Finalized') AS finalized,
+               ROUND(1.0 * SUM(status = 'Rejected') / COUNT(*), 4) AS rejectionRate
+        FROM transactions
+        WHERE (:start IS NULL OR created_at >= :start)
+          AND (:end IS NULL OR created_at < :end)
+          AND (:advocate IS NULL OR advocate_uid = :advocate)
+        GROUP BY advocate_uid
+        ORDER BY rejectionRate DESC, total DESC
+    """,
+    # Days from submittedAt to approvedAt, per month of approval
+    "property-approval-turnaround": """
+        SELECT strftime('%Y-%m', approved_at) AS month,
+               COUNT(*) AS approved,
+               ROUND(AVG(julianday(approved_at) - julianday(submitted_at)), 3) AS avgDays,
+               ROUND(MIN(julianday(approved_at) - julianday(submitted_at)), 3) AS minDays,
+               ROUND(MAX(julianday(approved_at) - julianday(submitted_at)), 3) AS maxDays
+        FROM property_records
+        WHERE collection = 'properties'
+          AND submitted_at IS NOT NULL AND approved_at IS NOT NULL
+          AND (:start IS NULL OR approved_at >= :start)
+          AND (:end IS NULL OR approved_at < :end)
+          AND (:reviewer IS NULL OR reviewed_by = :reviewer)
+        GROUP BY month
+        ORDER BY month
+    """,
+}
+
+# ===================================================================
+# --- REQUEST SCHEMAS & VALIDATION ---
+# ===================================================================
+
+# Each schema lists every field an endpoint accepts. Anything not listed is
+# dropped, so only known fields can ever reach Firestore.
+_ID = {"type": str, "maxLength": 128}
+_NAME = {"type": str, "maxLength": 200}
+_TEXT = {"type": str, "maxLength": 2000}
+_EMAIL = {"type": str, "maxLength": 254, "pattern": r"^[^@\s]+@[^@\s]+$"}
+_PHONE = {"type": str, "maxLength": 32, "pattern": r"^[0-9+\-() ]*$"}
+_WALLET = {"type": str, "maxLength": 64, "pattern": r"^0x[0-9a-fA-F]{40}$"}
+_HASH = {"type": str, "maxLength": 80, "pattern": r"^0x[0-9a-fA-F]+$"}
+_TOKEN_ID = {"type": (str, int), "maxLength": 80}
+
+REQUEST_SCHEMAS = {
+    "submit-advocate-application": {
+        "full-name": _NAME, "email": _EMAIL, "cert-number": _ID, "firm-name": _NAME,
+        "firm-reg": _ID, "phone": _PHONE, "address": _TEXT,
+    },
+    "add-property": {
+        "parcelNumber": {**_ID, "required": True}, "location": _TEXT,
+    },
+    "review-property": {
+        "propertyId": _ID, "action": {"type": str, "choices": ("approve", "reject")}, "comment": _TEXT,
+    },
+    "review-advocate-application": {
+        "applicationId": _ID, "action": {"type": str, "choices": ("approve", "reject")}, "comment": _TEXT,
+    },
+    "get-transaction-prereqs": {
+        "sellerNationalId": _ID, "buyerNationalId": _ID, "parcelNumber": _ID,
+    },
+    "create-transaction": {
+        "parcelNumber": {**_ID, "required": True}, "location": _TEXT,
+        "seller-id": {**_ID, "required": True}, "seller-name": _NAME, "seller-email": _EMAIL, "seller-phone": _PHONE,
+        "buyer-id": {**_ID, "required": True}, "buyer-name": _NAME, "buyer-email": _EMAIL, "buyer-phone": _PHONE,
+        "txHash": _HASH, "onChainTxId": {**_HASH, "required": True}, "tokenId": _TOKEN_ID,
+        "advocateAddress": _WALLET, "sellerWalletAddress": _WALLET, "buyerWalletAddress": _WALLET,
+    },
+    "verify-documents": {
+        "transactionId": _ID, "action": {"type": str, "choices": ("accept", "reject")}, "comment": _TEXT,
+    },
+    "advocate-upload-docs": {
+        "transactionId": _ID,
+    },
+    "admin-review-transaction": {
+        "transactionId": _ID, "action": {"type": str, "choices": ("approve", "reject", "finalize")}, "comment": _TEXT,
+        "finalTxHash": _HASH,
+    },
+    "review-queue-lease": {
+        "queue": {"type": str, "required": True, "choices": ("transactions", "properties", "advocateApplications")},
+        "action": {"type": str, "required": True, "choices": ("claim", "heartbeat", "release")},
+        "count": {"type": int}, "itemIds": {"type": list, "maxLength": 50},
+    },
+    "parcel-history": {
+        "parcelNumber": {**_ID, "required": True},
+    },
+    "admin-run-archive": {
+        "minAgeDays": {"type": int}, "collections": {"type": list, "maxLength": 10},
+    },
+    "get-archived-record": {
+        "collection": _ID, "docId": _ID,
+    },
+}
+
+# Transaction fields that are copied from the request into the Firestore doc.
+# Party details are stored in the nested buyer/seller/advocate objects instead.
+# `status` is not here on purpose: every deal starts at the first stage, whatever the client sends
+TRANSACTION_STORED_FIELDS = ("parcelNumber", "location", "txHash", "onChainTxId", "tokenId")
+
+MAX_JSON_BODY_BYTES = int(os.getenv("MAX_JSON_BODY_BYTES", str(16 * 1024)))
+
+def compile_schema(spec):
+    """
+    Turns a schema spec into a validator function. Regexes and per-field
+    checks are built once here, so validating a request is just a loop.
+    """
+    checks = []
+    for field_name, rules in spec.items():
+        expected_type = rules.get("type", str)
+        max_length = rules.get("maxLength")
+        choices = rules.get("choices")
+        pattern = re.compile(rules["pattern"]) if rules.get("pattern") else None
+        required = rules.get("required", False)
+        checks.append((field_name, expected_type, max_length, choices, pattern, required))
+
+    def validate(data):
+        """Returns (clean_data, error_message). clean_data only has known fields."""
+        clean = {}
+        for field_name, expected_type, max_length, choices, pattern, required in checks:
+            value = data.get(field_name)
+            if value is None or value == "":
+                if required:
+                    return None, f"Missing required field: {field_name}"
+                if field_name in data:
+                    clean[field_name] = value
+                continue
+            # bool is a subclass of int, don't let it pass as a number
+            if not isinstance(value, expected_type) or isinstance(value, bool):
+                return None, f"Invalid type for field: {field_name}"
+            if max_length is not None and len(value if not isinstance(value, int) else str(value)) > max_length:
+                return None, f"Field too long: {field_name}"
+            if choices is not None and value not in choices:
+                return None, f"Invalid value for field: {field_name}"
+            if pattern is not None and not pattern.match(value):
+                return None, f"Invalid format for field: {field_name}"
+            clean[field_name] = value
+        return clean, None
+
+    return validate
+
+_COMPILED_SCHEMAS = {name: compile_schema(spec) for name, spec in REQUEST_SCHEMAS.items()}
+
+def get_validated_json(schema_name):
+    """
+    Reads the JSON body (up to MAX_JSON_BODY_BYTES) and validates it.
+    Returns (data, None) on success or (None, error_response).
+    """
+    if request.content_length is not None and request.content_length > MAX_JSON_BODY_BYTES:
+        return None, (jsonify({"error": "Request body too large"}), 413)
+
+    # Read at most one byte over the limit, so chunked bodies can't slip past it
+    raw_body = request.stream.read(MAX_JSON_BODY_BYTES + 1)
+    if len(raw_body) > MAX_JSON_BODY_BYTES:
+        return None, (jsonify({"error": "Request body too large"}), 413)
+
+    try:
+        data = json.loads(raw_body or b"{}")
+    except ValueError:
+        return None, (jsonify({"error": "Request body must be valid JSON"}), 400)
+    if not isinstance(data, dict):
+        return None, (jsonify({"error": "Request body must be a JSON object"}), 400)
+
+    clean, error = _COMPILED_SCHEMAS[schema_name](data)
+    if error:
+        return None, (jsonify({"error": error}), 400)
+    return clean, None
+
+def get_validated_form(schema_name, fields=None):
+    """
+    Validates the non-file form fields (request.form unless `fields` is
+    given). Returns (data, None) or (None, error_response).
+    """
+    fields = request.form if fields is None else fields
+    clean, error = _COMPILED_SCHEMAS[schema_name](fields.to_dict())
+    if error:
+        return None, (jsonify({"error": error}), 400)
+    return clean, None
+
+def validate_form_fields(schema_name, fields):
+    """Like get_validated_form, but raises UploadRejected so it can run mid-upload."""
+    clean, error = _COMPILED_SCHEMAS[schema_name](fields.to_dict())
+    if error:
+        raise UploadRejected(error)
+    return clean
+
+# ===================================================================
+# --- ARCHIVAL HELPER FUNCTIONS ---
+# ===================================================================
+
+# For each hot collection: the timestamp fields used to measure age (set when
+# the record closed, so age counts from then), and which records count as
+# "closed" (safe to move to cold storage).
+# ownerFields: uids (dotted paths) that may read the archived record besides admins
+# transactionField: records that follow a transaction wait until it is closed or archived
+ARCHIVE_POLICIES = {
+    "transactions": {
+        "timestampFields": ["finalizedAt", "rejectedAt"],
+        "isClosed": lambda d: d.get("status") in ("Finalized", "Rejected"),
+        "ownerFields": ["buyer.uid", "seller.uid", "advocate.uid"],
+    },
+    "logs": {
+        "timestampFields": ["timestamp"],
+        "isClosed": lambda d: True,
+        "ownerFields": ["advocateUid"],
+        "transactionField": "relatedTransaction",
+    },
+    "notifications": {
+        "timestampFields": ["createdAt"],
+        "isClosed": lambda d: d.get("read") is True,
+        "ownerFields": ["userId"],
+    },
+    "rejectedProperties": {
+        "timestampFields": ["rejectedAt"],
+        "isClosed": lambda d: True,
+        "ownerFields": ["uid"],
+    },
+    "advocateApplications": {
+        "timestampFields": ["reviewedAt"],
+        "isClosed": lambda d: d.get("status") in ("approved", "rejected"),
+        "ownerFields": ["uid"],
+    },
+}
+
+def _firestore_json_default(value):
+    """Makes Firestore values (timestamps, refs, geopoints) JSON serializable."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if hasattr(value, "path"):
+        return value.path
+    return str(value)
+
+def _archive_index_id(collection_name, doc_id):
+    return f"{collection_name}_{doc_id}"
+
+def _write_archive_chunk(collection_name, ts_field, snapshots, run_id):
+    """
+    Writes one chunk of closed records to date-partitioned NDJSON.gz objects,
+    then records an index entry and deletes each source doc in a single batch.
+    Returns the number of records archived.
+    """
+    # Group by the record's own date so objects land in the right partition
+    partitions = {}
+    for snap in snapshots:
+        data = snap.to_dict()
+        ts = data.get(ts_field)
+        day = ts.strftime("%Y/%m/%d") if ts else "undated"
+        partitions.setdefault(day, []).append((snap, data))
+
+    batch = db.batch()
+    archived_count = 0
+    for day, records in partitions.items():
+        object_path = f"archive/{collection_name}/{day}/{run_id}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+        lines = [
+            json.dumps({"id": snap.id, "data": data}, default=_firestore_json_default)
+            for snap, data in records
+        ]
+        blob = bucket.blob(object_path)
+        storage_breaker.call(
+            blob.upload_from_string,
+            gzip.compress(("\n".join(lines) + "\n").encode("utf-8")),
+            content_type="application/gzip",
+            timeout=STORAGE_TIMEOUT_SECONDS
+        )
+
+        # Only touch the hot collection once the object is safely in Storage
+        for snap, data in records:
+            batch.set(db.collection("archiveIndex").document(_archive_index_id(collection_name, snap.id)), {
+                "collection": collection_name,
+                "docId": snap.id,
+                "objectPath": object_path,
+                "parcelNumber": data.get("parcelNumber"),
+                "uid": data.get("uid") or data.get("userId"),
+                "archivedAt": firestore.SERVER_TIMESTAMP
+            })
+            batch.delete(snap.reference)
+            archived_count += 1
+
+    firestore_call(batch.commit)
+    return archived_count
+
+def _without_open_transactions(snapshots, transaction_field):
+    """
+    Drops records whose related transaction is still open. A transaction
+    that is no longer in the hot collection has been archived (or deleted).
+    """
+    transaction_ids = {snap.to_dict().get(transaction_field) for snap in snapshots} - {None}
+    if not transaction_ids:
+        return snapshots
+    refs = [db.collection("transactions").document(tx_id) for tx_id in transaction_ids]
+    tx_docs = firestore_breaker.call(lambda: list(db.get_all(refs, timeout=FIRESTORE_TIMEOUT_SECONDS)))
+    is_closed = ARCHIVE_POLICIES["transactions"]["isClosed"]
+    open_ids = {doc.id for doc in tx_docs if doc.exists and not is_closed(doc.to_dict())}
+    return [snap for snap in snapshots if snap.to_dict().get(transaction_field) not in open_ids]
+
+def archive_closed_records(min_age_days=None, collections=None):
+    """
+    Moves closed records older than `min_age_days` from the hot collections
+    into cold storage. Returns a dict of {collection: archived_count}.
+    """
+    if min_age_days is None:
+        min_age_days = ARCHIVE_MIN_AGE_DAYS
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=min_age_days)
+    run_id = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    summary = {}
+    for collection_name in (collections or ARCHIVE_POLICIES.keys()):
+        policy = ARCHIVE_POLICIES[collection_name]
+        archived_count = 0
+
+        for ts_field in policy["timestampFields"]:
+            last_snapshot = None
+
+            # Page through old records with a cursor; open records are skipped,
+            # not deleted, so the cursor (not the deletes) drives progress.
+            while True:
+                query = (db.collection(collection_name)
+                         .where(ts_field, "<", cutoff)
+                         .order_by(ts_field)
+                         .limit(ARCHIVE_BATCH_SIZE))
+                if last_snapshot is not None:
+                    query = query.start_after(last_snapshot)
+                page = firestore_stream(query)
+                if not page:
+                    break
+                last_snapshot = page[-1]
+
+                closed = [snap for snap in page if policy["isClosed"](snap.to_dict())]
+                if closed and policy.get("transactionField"):
+                    closed = _without_open_transactions(closed, policy["transactionField"])
+                if closed:
+                    archived_count += _write_archive_chunk(collection_name, ts_field, closed, run_id)
+
+                if len(page) < ARCHIVE_BATCH_SIZE:
+                    break
+
+        summary[collection_name] = archived_count
+        print(f"Archived {archived_count} records from '{collection_name}'.")
+
+    return summary
+
+def get_archived_record(collection_name, doc_id):
+    """
+    Looks up an archived record through its index entry and reads it back
+    from Storage. Returns the record's data or None.
+    """
+    index_doc = firestore_call(db.collection("archiveIndex").document(_archive_index_id(collection_name, doc_id)).get)
+    if not index_doc.exists:
+        return None
+
+    blob = bucket.blob(index_doc.to_dict().get("objectPath"))
+    try:
+        raw = storage_breaker.call(blob.download_as_bytes, timeout=STORAGE_TIMEOUT_SECONDS)
+    except google_exceptions.NotFound:
+        return None
+
+    for line in gzip.decompress(raw).decode("utf-8").splitlines():
+        if not line:
+            continue
+        record = json.loads(line)
+        if record.get("id") == doc_id:
+            return record.get("data")
+    return None
+
+# ===================================================================
+# --- EXPORT HELPER FUNCTIONS ---
+# ===================================================================
+
+# For each exportable collection: the timestamp used for date-range filters,
+# the field matched by the advocate filter, and the CSV columns (dotted paths).
+EXPORT_POLICIES = {
+    "transactions": {
+        "timestampField": "createdAt",
+        "advocateField": "advocate.uid",
+        "columns": [
+            "parcelNumber", "location", "status", "tokenId", "txHash", "onChainTxId",
+            "advocate.uid", "advocate.name", "seller.uid", "seller.name",
+            "buyer.uid", "buyer.name", "assignedAdmin", "reviewedBy",
+            "createdAt", "finalizedAt", "finalTxHash"
+        ],
+    },
+    "properties": {
+        "timestampField": "approvedAt",
+        "advocateField": None,
+        "columns": [
+            "parcelNumber", "location", "uid", "ownerWalletAddress", "status",
+            "tokenId", "txHash", "reviewedBy", "submittedAt", "approvedAt"
+        ],
+    },
+    "logs": {
+        "timestampField": "timestamp",
+        "advocateField": "advocateUid",
+        "columns": [
+            "message", "timestamp", "txHash", "advocateUid",
+            "relatedTransaction", "propertyId"
+        ],
+    },
+}
+
+def _get_dotted(data, path):
+    """Reads a nested value like 'buyer.uid' from a Firestore dict."""
+    value = data
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+def _export_cell(value):
+    """Converts a Firestore value into something csv.writer can write."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_firestore_json_default)
+    return _firestore_json_default(value)
+
+def _build_export_query(collection_name, start_date=None, end_date=None, status=None, advocate_uid=None):
+    """
+    Builds the base Firestore query for an export. Date-range exports are
+    ordered by the collection's timestamp field, everything else by document
+    ID so documents missing that field are still included.
+    """
+    policy = EXPORT_POLICIES[collection_name]
+    query = db.collection(collection_name)
+
+    if status:
+        query = query.where("status", "==", status)
+    if advocate_uid:
+        query = query.where(policy["advocateField"], "==", advocate_uid)
+
+    if start_date or end_date:
+        ts_field = policy["timestampField"]
+        if start_date:
+            query = query.where(ts_field, ">=", start_date)
+        if end_date:
+            query = query.where(ts_field, "<", end_date)
+        return query.order_by(ts_field)
+
+    return query.order_by("__name__")
+
+def iter_export_snapshots(query):
+    """Yields every document matching `query`, one page at a time."""
+    last_snapshot = None
+    while True:
+        page_query = query.limit(EXPORT_PAGE_SIZE)
+        if last_snapshot is not None:
+            page_query = page_query.start_after(last_snapshot)
+        page = firestore_stream(page_query)
+        if not page:
+            return
+        for snap in page:
+            yield snap
+        if len(page) < EXPORT_PAGE_SIZE:
+            return
+        last_snapshot = page[-1]
+
+def generate_export(collection_name, snapshots, export_format, compress):
+    """
+    Streams an export as CSV or NDJSON text chunks (one chunk per page),
+    optionally gzip-compressed on the fly. A failure mid-stream is re-raised,
+    which makes the server drop the connection without the final chunk (and
+    without the gzip trailer), so the client sees a failed download rather
+    than a short file.
+    """
+    columns = EXPORT_POLICIES[collection_name]["columns"]
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None # wbits=31 -> gzip container
+
+    def emit(text):
+        if compressor is None:
+            return text.encode("utf-8")
+        # Sync-flush so every page reaches the client instead of sitting in the compressor
+        return compressor.compress(text.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if export_format == "csv":
+        writer.writerow(["id"] + columns)
+        yield emit(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    rows_in_buffer = 0
+    try:
+        for snap in snapshots:
+            data = snap.to_dict()
+            if export_format == "csv":
+                writer.writerow([snap.id] + [_export_cell(_get_dotted(data, column)) for column in columns])
+            else:
+                buffer.write(json.dumps({"id": snap.id, **data}, default=_firestore_json_default))
+                buffer.write("\n")
+
+            rows_in_buffer += 1
+            if rows_in_buffer >= EXPORT_PAGE_SIZE:
+                yield emit(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate(0)
+                rows_in_buffer = 0
+    except Exception as e:
+        print(f"Export of '{collection_name}' failed mid-stream, aborting the response: {e}")
+        raise
+
+    if rows_in_buffer:
+        yield emit(buffer.getvalue())
+    if compressor is not None:
+        yield compressor.flush()
 
 # ===================================================================
 # --- API ENDPOINTS ---
 # ===================================================================
 
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness check for load balancers and the worker benchmark."""
+    return jsonify({"status": "ok", "pid": os.getpid()}), 200
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Circuit breaker state for this worker, in Prometheus text format."""
+    state_values = {"closed": 0, "half-open": 1, "open": 2}
+    lines = [
+        "# HELP nexus_breaker_state Circuit breaker state (0=closed, 1=half-open, 2=open).",
+        "# TYPE nexus_breaker_state gauge",
+    ]
+    for breaker in CIRCUIT_BREAKERS:
+        lines.append(f'nexus_breaker_state{{dependency="{breaker.name}"}} {state_values[breaker.snapshot()["state"]]}')
+
+    lines += ["# HELP nexus_breaker_calls_total Calls seen by each circuit breaker, by outcome.",
+              "# TYPE nexus_breaker_calls_total counter"]
+    for breaker in CIRCUIT_BREAKERS:
+        snapshot = breaker.snapshot()
+        for outcome in ("success", "failure", "rejected", "deferred"):
+            lines.append(f'nexus_breaker_calls_total{{dependency="{breaker.name}",outcome="{outcome}"}} {snapshot[outcome]}')
+
+    lines += ["# HELP nexus_breaker_opened_total Times each circuit breaker has opened.",
+              "# TYPE nexus_breaker_opened_total counter"]
+    for breaker in CIRCUIT_BREAKERS:
+        lines.append(f'nexus_breaker_opened_total{{dependency="{breaker.name}"}} {breaker.snapshot()["opened"]}')
+
+    lines += ["# HELP nexus_breaker_deferred_queued Side effects waiting for a breaker to close.",
+              "# TYPE nexus_breaker_deferred_queued gauge"]
+    for breaker in CIRCUIT_BREAKERS:
+        lines.append(f'nexus_breaker_deferred_queued{{dependency="{breaker.name}"}} {breaker.snapshot()["deferredQueued"]}')
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
 @app.route("/submit-advocate-application", methods=["POST"])
 def submit_advocate_application():
     try:
@@ -153,16 +2103,28 @@ def submit_advocate_application():
         id_token = auth_header.split("Bearer ")[1]
         decoded_token = auth.verify_id_token(id_token)
         uid = decoded_token["uid"]
-        form_data = request.form
-        files = request.files
-        
-        file_urls = {
-            'cert-file': upload_file_to_storage(files.get('cert-file'), uid, 'advocate-practicing-cert'),
-            'lsk-id-file': upload_file_to_storage(files.get('lsk-id-file'), uid, 'advocate-lsk-id'),
-            'national-id-file': upload_file_to_storage(files.get('national-id-file'), uid, 'advocate-national-id'),
-            'profile-photo-file': upload_file_to_storage(files.get('profile-photo-file'), uid, 'advocate-profile-photo'),
+
+        file_prefixes = {
+            'cert-file': 'advocate-practicing-cert',
+            'lsk-id-file': 'advocate-lsk-id',
+            'national-id-file': 'advocate-national-id',
+            'profile-photo-file': 'advocate-profile-photo',
         }
 
+        def on_file(field_name, file, fields):
+            if field_name not in file_prefixes:
+                return None
+            validate_form_fields("submit-advocate-application", fields)
+            return upload_file_to_storage(file, uid, file_prefixes[field_name])
+
+        # Each file goes to Storage as soon as it has arrived
+        fields, uploaded = parse_streaming_multipart(on_file)
+        form_data, error_response = get_validated_form("submit-advocate-application", fields)
+        if error_response:
+            return error_response
+        
+        file_urls = {field_name: uploaded.get(field_name) for field_name in file_prefixes}
+
         app_data = {
             "uid": uid,
             "fullName": form_data.get('full-name'),
@@ -178,7 +2140,7 @@ def submit_advocate_application():
             "submittedAt": firestore.SERVER_TIMESTAMP
         }
         
-        db.collection("advocateApplications").add(app_data)
+        firestore_call(db.collection("advocateApplications").add, app_data)
         
         create_notification(uid, "Your advocate application was submitted successfully and is now pending review.", "/dashboard")
 
@@ -186,6 +2148,10 @@ def submit_advocate_application():
 
     except auth.InvalidIdTokenError:
         return jsonify({"error": "Invalid or expired token"}), 403
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), e.status
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
@@ -203,7 +2169,7 @@ def add_property():
         uid = decoded_token["uid"]
 
         user_doc_ref = db.collection("users").document(uid)
-        user_doc = user_doc_ref.get()
+        user_doc = firestore_call(user_doc_ref.get)
         if not user_doc.exists:
             return jsonify({"error": "User profile not found"}), 404
         
@@ -212,14 +2178,25 @@ def add_property():
         if not user_wallet_address:
             return jsonify({"error": "User wallet address not found. Please update your profile."}), 400
 
-        form_data = request.form
-        files = request.files
-        
-        file_urls = {
-            'titleDeedFile': upload_file_to_storage(files.get('titleDeedFile'), uid, 'property-title-deed'),
-            'surveyMapFile': upload_file_to_storage(files.get('surveyMapFile'), uid, 'property-survey-map'),
+        file_prefixes = {
+            'titleDeedFile': 'property-title-deed',
+            'surveyMapFile': 'property-survey-map',
         }
 
+        def on_file(field_name, file, fields):
+            if field_name not in file_prefixes:
+                return None
+            validate_form_fields("add-property", fields)
+            return upload_file_to_storage(file, uid, file_prefixes[field_name])
+
+        # Each file goes to Storage as soon as it has arrived
+        fields, uploaded = parse_streaming_multipart(on_file)
+        form_data, error_response = get_validated_form("add-property", fields)
+        if error_response:
+            return error_response
+        
+        file_urls = {field_name: uploaded.get(field_name) for field_name in file_prefixes}
+
         property_data = {
             "uid": uid,
             "ownerWalletAddress": user_wallet_address, 
@@ -231,7 +2208,16 @@ def add_property():
             "assignedAdmin": None,
         }
         
-        timestamp, doc_ref = db.collection("pendingProperties").add(property_data)
+        timestamp, doc_ref = firestore_call(db.collection("pendingProperties").add, property_data)
+        search_index_upsert("pendingProperties", doc_ref.id, property_data)
+        
+        # A new submission must not downgrade an already registered parcel
+        update_parcel_index(property_data['parcelNumber'], {"status": "pending", "propertyId": doc_ref.id}, {
+            "type": "submitted",
+            "propertyId": doc_ref.id,
+            "actorUid": uid,
+            "ownerWalletAddress": user_wallet_address
+        }, keep_if_approved=True)
         
         create_notification(uid, f"Your property ({property_data['parcelNumber']}) was submitted successfully and is pending verification.", "/properties")
         
@@ -239,6 +2225,10 @@ def add_property():
 
     except auth.InvalidIdTokenError:
         return jsonify({"error": "Invalid or expired token"}), 403
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), e.status
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
@@ -254,11 +2244,13 @@ def review_property():
         decoded_token = auth.verify_id_token(id_token)
         admin_uid = decoded_token["uid"]
 
-        admin_doc = db.collection("users").document(admin_uid).get()
+        admin_doc = firestore_call(db.collection("users").document(admin_uid).get)
         if not admin_doc.exists or not admin_doc.to_dict().get("isAdmin"):
             return jsonify({"error": "Insufficient permissions. Admin role required."}), 403
 
-        data = request.get_json()
+        data, error_response = get_validated_json("review-property")
+        if error_response:
+            return error_response
         property_id = data.get("propertyId")
         action = data.get("action")
         comment = data.get("comment")
@@ -267,13 +2259,16 @@ def review_property():
             return jsonify({"error": "Missing propertyId or action"}), 400
             
         pending_prop_ref = db.collection("pendingProperties").document(property_id)
-        pending_prop_doc = pending_prop_ref.get()
+        pending_prop_doc = firestore_call(pending_prop_ref.get)
         
         approved_prop_ref = db.collection("properties").document(property_id)
-        approved_prop_doc = approved_prop_ref.get()
+        approved_prop_doc = firestore_call(approved_prop_ref.get)
         
         rejected_prop_ref = db.collection("rejectedProperties").document(property_id)
 
+        if pending_prop_doc.exists and lease_held_by_other(pending_prop_doc.to_dict(), admin_uid):
+            return jsonify({"error": "This item is being reviewed by another admin."}), 409
+
         if action == "reject":
             if not comment:
                 return jsonify({"error": "Comment is required for rejection"}), 400
@@ -284,7 +2279,7 @@ def review_property():
             prop_data = pending_prop_doc.to_dict()
             owner_uid = prop_data.get("uid")
             
-            owner_doc = db.collection("users").document(owner_uid).get()
+            owner_doc = firestore_call(db.collection("users").document(owner_uid).get)
             owner_name = "User"
             owner_email = None
             if owner_doc.exists:
@@ -300,7 +2295,15 @@ def review_property():
             batch = db.batch()
             batch.set(rejected_prop_ref, new_rejected_data)
             batch.delete(pending_prop_ref)
-            batch.commit()
+            firestore_call(batch.commit)
+            search_index_remove("pendingProperties", property_id)
+            
+            update_parcel_index(prop_data.get('parcelNumber'), {"status": "rejected"}, {
+                "type": "rejected",
+                "propertyId": property_id,
+                "actorUid": admin_uid,
+                "comment": comment
+            }, keep_if_approved=True)
             
             subject = f"Action Required: Your Property ({prop_data.get('parcelNumber')}) Was Rejected"
             message_html = f"Hello {owner_name},<br><br>There was an issue verifying <b>{prop_data.get('parcelNumber')}</b>. <br><b>Reason:</b> {comment}"
@@ -308,7 +2311,7 @@ def review_property():
             
             create_notification(owner_uid, message_plain, "/properties")
             if owner_email:
-                send_email(owner_email, owner_name, subject, message_html)
+                submit_background(send_email, owner_email, owner_name, subject, message_html)
                 
             return jsonify({"message": "Property rejected and moved successfully"}), 200
 
@@ -318,7 +2321,12 @@ def review_property():
                 prop_data = pending_prop_doc.to_dict()
                 owner_uid = prop_data.get("uid")
 
-                owner_doc = db.collection("users").document(owner_uid).get()
+                # A duplicate submission must not replace the parcel's existing (possibly minted) property
+                existing_entry = get_parcel_entry(prop_data.get("parcelNumber"))
+                if existing_entry and existing_entry.get("status") == "approved" and existing_entry.get("propertyId") != property_id:
+                    return jsonify({"error": "This parcel is already registered to another approved property."}), 409
+
+                owner_doc = firestore_call(db.collection("users").document(owner_uid).get)
                 owner_name = "User"
                 owner_email = None
                 if owner_doc.exists:
@@ -340,7 +2348,22 @@ def review_property():
                 batch = db.batch()
                 batch.set(approved_prop_ref, new_prop_data)
                 batch.delete(pending_prop_ref)
-                batch.commit()
+                firestore_call(batch.commit)
+                search_index_remove("pendingProperties", property_id)
+                search_index_upsert("properties", property_id, new_prop_data)
+                
+                update_parcel_index(prop_data.get('parcelNumber'), {
+                    "propertyId": property_id,
+                    "ownerUid": owner_uid,
+                    "ownerWalletAddress": prop_data.get("ownerWalletAddress"),
+                    "status": "approved",
+                    "tokenId": None
+                }, {
+                    "type": "approved",
+                    "propertyId": property_id,
+                    "actorUid": admin_uid,
+                    "ownerWalletAddress": prop_data.get("ownerWalletAddress")
+                })
                 
                 subject = f"Your Property Has Been Approved ({prop_data.get('parcelNumber')})"
                 message_html = f"Hello {owner_name},<br><br>Good news! Your property <b>{prop_data.get('parcelNumber')}</b> has been approved by an admin. It is now ready to be minted to the blockchain."
@@ -348,7 +2371,7 @@ def review_property():
                 
                 create_notification(owner_uid, message_plain, "/properties")
                 if owner_email:
-                    send_email(owner_email, owner_name, subject, message_html)
+                    submit_background(send_email, owner_email, owner_name, subject, message_html)
                 
                 return jsonify({
                     "message": "Property approved in database. Please confirm on-chain minting.",
@@ -377,6 +2400,8 @@ def review_property():
 
     except auth.InvalidIdTokenError:
         return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
     except Exception as e:
         print(f"Error in review-property: {e}")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
@@ -392,11 +2417,13 @@ def review_advocate_application():
         decoded_token = auth.verify_id_token(id_token)
         admin_uid = decoded_token["uid"]
 
-        admin_doc = db.collection("users").document(admin_uid).get()
+        admin_doc = firestore_call(db.collection("users").document(admin_uid).get)
         if not admin_doc.exists or not admin_doc.to_dict().get("isAdmin"):
             return jsonify({"error": "Insufficient permissions. Admin role required."}), 403
 
-        data = request.get_json()
+        data, error_response = get_validated_json("review-advocate-application")
+        if error_response:
+            return error_response
         application_id = data.get("applicationId")
         action = data.get("action")
         comment = data.get("comment")
@@ -405,14 +2432,16 @@ def review_advocate_application():
             return jsonify({"error": "Missing applicationId or action"}), 400
             
         app_ref = db.collection("advocateApplications").document(application_id)
-        app_doc = app_ref.get()
+        app_doc = firestore_call(app_ref.get)
         if not app_doc.exists:
             return jsonify({"error": "Application not found"}), 404
         app_data = app_doc.to_dict()
+        if lease_held_by_other(app_data, admin_uid):
+            return jsonify({"error": "This item is being reviewed by another admin."}), 409
         
         applicant_uid = app_data.get("uid")
         user_ref = db.collection("users").document(applicant_uid)
-        user_doc = user_ref.get()
+        user_doc = firestore_call(user_ref.get)
         if not user_doc.exists:
             return jsonify({"error": "Applicant's user profile not found"}), 404
         
@@ -424,10 +2453,11 @@ def review_advocate_application():
             if not comment:
                 return jsonify({"error": "Comment is required for rejection"}), 400
             
-            app_ref.update({
+            firestore_call(app_ref.update, {
                 "status": "rejected",
                 "rejectionComment": comment,
-                "reviewedBy": admin_uid
+                "reviewedBy": admin_uid,
+                "reviewedAt": firestore.SERVER_TIMESTAMP
             })
             
             subject = "Your Advocate Application Has Been Rejected"
@@ -436,7 +2466,7 @@ def review_advocate_application():
             
             create_notification(applicant_uid, message_plain, "/dashboard")
             if user_email:
-                send_email(user_email, user_name, subject, message_html)
+                submit_background(send_email, user_email, user_name, subject, message_html)
                 
             return jsonify({"message": "Application rejected successfully"}), 200
 
@@ -448,11 +2478,12 @@ def review_advocate_application():
             if not on_chain_data["advocateWalletAddress"]:
                 return jsonify({"error": "Cannot approve: User has no wallet address linked."}), 400
 
-            app_ref.update({
+            firestore_call(app_ref.update, {
                 "status": "approved",
-                "reviewedBy": admin_uid
+                "reviewedBy": admin_uid,
+                "reviewedAt": firestore.SERVER_TIMESTAMP
             })
-            user_ref.update({
+            firestore_call(user_ref.update, {
                 "isAdvocate": True
             })
             
@@ -462,7 +2493,7 @@ def review_advocate_application():
             
             create_notification(applicant_uid, message_plain, "/dashboard")
             if user_email:
-                send_email(user_email, user_name, subject, message_html)
+                submit_background(send_email, user_email, user_name, subject, message_html)
             
             return jsonify({
                 "message": "Application approved in database. Please confirm on-chain role grant.",
@@ -474,6 +2505,8 @@ def review_advocate_application():
 
     except auth.InvalidIdTokenError:
         return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
@@ -492,7 +2525,7 @@ def get_transaction_prereqs():
         decoded_token = auth.verify_id_token(id_token)
         advocate_uid = decoded_token["uid"]
 
-        advocate_doc = db.collection("users").document(advocate_uid).get()
+        advocate_doc = firestore_call(db.collection("users").document(advocate_uid).get)
         if not advocate_doc.exists:
             return jsonify({"error": "Advocate profile not found."}), 403
         
@@ -500,7 +2533,9 @@ def get_transaction_prereqs():
         if not advocate_data.get("isAdvocate") and not advocate_data.get("isAdmin"):
             return jsonify({"error": "Insufficient permissions."}), 403
 
-        data = request.get_json()
+        data, error_response = get_validated_json("get-transaction-prereqs")
+        if error_response:
+            return error_response
         seller_national_id = data.get("sellerNationalId")
         buyer_national_id = data.get("buyerNationalId")
         parcel_number = data.get("parcelNumber")
@@ -527,6 +2562,8 @@ def get_transaction_prereqs():
 
     except auth.InvalidIdTokenError:
         return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
     except Exception as e:
         print(f"Error in get-transaction-prereqs: {e}")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
@@ -542,14 +2579,16 @@ def create_transaction():
         id_token = auth_header.split("Bearer ")[1]
         decoded_token = auth.verify_id_token(id_token)
         advocate_uid = decoded_token["uid"]
-        advocate_doc = db.collection("users").document(advocate_uid).get()
+        advocate_doc = firestore_call(db.collection("users").document(advocate_uid).get)
         advocate_data = advocate_doc.to_dict()
 
         if not advocate_data.get("isAdvocate") and not advocate_data.get("isAdmin"):
             return jsonify({"error": "Insufficient permissions."}), 403
 
         # 2. Get Full Payload from React
-        data = request.get_json()
+        data, error_response = get_validated_json("create-transaction")
+        if error_response:
+            return error_response
         
         # 3. Get Firebase UIDs for Buyer and Seller
         seller_national_id = data.get("seller-id")
@@ -562,8 +2601,8 @@ def create_transaction():
         if not buyer_uid:
             return jsonify({"error": f"Buyer with National ID '{buyer_national_id}' not found."}), 404
 
-        # 4. Prepare Data for Batched Write
-        transaction_data = data.copy()
+        # 4. Prepare Data for Batched Write (whitelisted fields only)
+        transaction_data = {key: data[key] for key in TRANSACTION_STORED_FIELDS if key in data}
         advocate_name = advocate_data.get("firstName", advocate_data.get("email"))
         
         transaction_data["advocate"] = {
@@ -590,6 +2629,7 @@ def create_transaction():
             "verifiedDocs": None
         }
         
+        transaction_data["status"] = "Awaiting Signatures"
         transaction_data["createdAt"] = firestore.SERVER_TIMESTAMP
         
         # ---
@@ -601,15 +2641,6 @@ def create_transaction():
         # --- *** END OF FIX *** ---
         # ---
         
-        redundant_keys = [
-            'advocateAddress', 'seller-name', 'seller-id', 'seller-email', 'seller-phone',
-            'sellerWalletAddress', 'buyer-name', 'buyer-id', 'buyer-email', 'buyer-phone',
-            'buyerWalletAddress'
-        ]
-        for key in redundant_keys:
-            transaction_data.pop(key, None)
-
-        
         # B. Log Document
         log_message = f"Advocate {advocate_name} initiated transaction for property {data.get('parcelNumber')} (Token ID: {data.get('tokenId')})."
         log_data = {
@@ -626,13 +2657,25 @@ def create_transaction():
         log_data["relatedTransaction"] = new_tx_ref.id
         batch.set(new_tx_ref, transaction_data)
         batch.set(db.collection("logs").document(), log_data)
-        batch.commit()
+        firestore_call(batch.commit)
+        search_index_upsert("transactions", new_tx_ref.id, transaction_data)
+
+        update_parcel_index(data.get('parcelNumber'), {"activeTransactionId": new_tx_ref.id}, {
+            "type": "transaction-initiated",
+            "transactionId": new_tx_ref.id,
+            "actorUid": advocate_uid,
+            "sellerWalletAddress": data.get("sellerWalletAddress"),
+            "buyerWalletAddress": data.get("buyerWalletAddress"),
+            "txHash": data.get("txHash")
+        })
 
         # 6. Return the new Transaction ID
         return jsonify({"message": "Transaction created successfully", "transactionId": new_tx_ref.id}), 201
 
     except auth.InvalidIdTokenError:
         return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
     except Exception as e:
         print(f"Error in create-transaction: {e}")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
@@ -653,7 +2696,9 @@ def verify_documents():
         user_uid = decoded_token["uid"]
 
         # 2. Get data from React
-        data = request.get_json()
+        data, error_response = get_validated_json("verify-documents")
+        if error_response:
+            return error_response
         transaction_id = data.get("transactionId")
         action = data.get("action")
         comment = data.get("comment")
@@ -666,7 +2711,7 @@ def verify_documents():
 
         # 3. Get the transaction document
         tx_ref = db.collection("transactions").document(transaction_id)
-        tx_doc = tx_ref.get()
+        tx_doc = firestore_call(tx_ref.get)
         if not tx_doc.exists:
             return jsonify({"error": "Transaction not found"}), 404
         
@@ -702,7 +2747,7 @@ def verify_documents():
             
             # Notify all admins that it's ready for review
             try:
-                admin_query = db.collection("users").where("isAdmin", "==", True).stream()
+                admin_query = firestore_stream(db.collection("users").where("isAdmin", "==", True))
                 admin_ids = [admin.id for admin in admin_query]
                 
                 if not admin_ids:
@@ -722,7 +2767,8 @@ def verify_documents():
             update_data[f"{user_role.lower()}.rejectionComment"] = comment
 
         # 8. Commit the update to Firestore
-        tx_ref.update(update_data)
+        firestore_call(tx_ref.update, update_data)
+        invalidate_transaction_detail(transaction_id)
         
         # 9. (Optional) Create notifications
         if advocate_uid:
@@ -733,6 +2779,8 @@ def verify_documents():
 
     except auth.InvalidIdTokenError:
         return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
     except Exception as e:
         print(f"Error in verify-documents: {e}")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
@@ -752,7 +2800,7 @@ def advocate_upload_docs():
         decoded_token = auth.verify_id_token(id_token)
         advocate_uid = decoded_token["uid"]
 
-        advocate_doc = db.collection("users").document(advocate_uid).get()
+        advocate_doc = firestore_call(db.collection("users").document(advocate_uid).get)
         if not advocate_doc.exists:
             return jsonify({"error": "Advocate profile not found."}), 403
         
@@ -762,31 +2810,36 @@ def advocate_upload_docs():
         
         advocate_name = advocate_data.get("firstName", advocate_data.get("email"))
 
-        # 2. Get data from FormData
-        transaction_id = request.form.get("transactionId")
-        files = request.files.getlist("files")
-        doc_names = request.form.getlist("docNames")
-
-        if not transaction_id:
-            return jsonify({"error": "Missing transactionId"}), 400
-        if not files or not doc_names or len(files) != len(doc_names):
-            return jsonify({"error": "File and document name mismatch"}), 400
-            
-        # 3. Get the transaction to update it
-        tx_ref = db.collection("transactions").document(transaction_id)
-        tx_doc = tx_ref.get()
-        if not tx_doc.exists:
-            return jsonify({"error": "Transaction not found"}), 404
-            
-        tx_data = tx_doc.to_dict()
-
-        # 4. Upload files and build the doc list
+        # 2. Stream the FormData: transactionId first, then a docNames entry before each file
+        upload_state = {"tx_ref": None, "tx_data": None, "file_count": 0}
         newly_uploaded_docs = []
-        for i in range(len(files)):
-            file = files[i]
-            doc_name = doc_names[i]
-            
-            file_prefix = f"tx/{transaction_id}/{advocate_uid}/{doc_name}"
+
+        def on_file(field_name, file, fields):
+            if field_name != "files":
+                return None
+
+            # 3. Get the transaction to update it (once, before the first upload)
+            if upload_state["tx_ref"] is None:
+                transaction_id = validate_form_fields("advocate-upload-docs", fields).get("transactionId")
+                if not transaction_id:
+                    raise UploadRejected("Missing transactionId")
+                tx_ref = db.collection("transactions").document(transaction_id)
+                tx_doc = firestore_call(tx_ref.get)
+                if not tx_doc.exists:
+                    raise UploadRejected("Transaction not found", 404)
+                upload_state["tx_ref"] = tx_ref
+                upload_state["tx_data"] = tx_doc.to_dict()
+
+            doc_names = fields.getlist("docNames")
+            if len(doc_names) <= upload_state["file_count"]:
+                raise UploadRejected("File and document name mismatch")
+            doc_name = doc_names[upload_state["file_count"]]
+            if not doc_name or len(doc_name) > 128 or "/" in doc_name:
+                raise UploadRejected("Invalid document name")
+            upload_state["file_count"] += 1
+
+            # 4. Upload the file and add it to the doc list
+            file_prefix = f"tx/{upload_state['tx_ref'].id}/{advocate_uid}/{doc_name}"
             file_url = upload_file_to_storage(file, advocate_uid, file_prefix)
             
             if file_url:
@@ -799,6 +2852,16 @@ def advocate_upload_docs():
                         "name": advocate_name
                     }
                 })
+            return file_url
+
+        fields, uploaded = parse_streaming_multipart(on_file)
+
+        if not uploaded.getlist("files") or len(fields.getlist("docNames")) != upload_state["file_count"]:
+            return jsonify({"error": "File and document name mismatch"}), 400
+
+        tx_ref = upload_state["tx_ref"]
+        tx_data = upload_state["tx_data"]
+        transaction_id = tx_ref.id
 
         # 5. Update the transaction document
         update_data = {
@@ -808,7 +2871,8 @@ def advocate_upload_docs():
             "seller.verifiedDocs": None
         }
         
-        tx_ref.update(update_data)
+        firestore_call(tx_ref.update, update_data)
+        invalidate_transaction_detail(transaction_id)
         
         # 6. Create notifications for buyer and seller
         buyer_uid = tx_data.get("buyer", {}).get("uid")
@@ -826,6 +2890,10 @@ def advocate_upload_docs():
 
     except auth.InvalidIdTokenError:
         return jsonify({"error": "Invalid or expired token"}), 403
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), e.status
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
     except Exception as e:
         print(f"Error in advocate-upload-docs: {e}")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
@@ -845,12 +2913,14 @@ def admin_review_transaction():
         decoded_token = auth.verify_id_token(id_token)
         admin_uid = decoded_token["uid"]
 
-        admin_doc = db.collection("users").document(admin_uid).get()
+        admin_doc = firestore_call(db.collection("users").document(admin_uid).get)
         if not admin_doc.exists or not admin_doc.to_dict().get("isAdmin"):
             return jsonify({"error": "Insufficient permissions."}), 403
 
         # 2. Get data from React
-        data = request.get_json()
+        data, error_response = get_validated_json("admin-review-transaction")
+        if error_response:
+            return error_response
         transaction_id = data.get("transactionId")
         action = data.get("action")
         comment = data.get("comment")
@@ -859,21 +2929,32 @@ def admin_review_transaction():
             return jsonify({"error": "Missing transactionId or action"}), 400
         
         tx_ref = db.collection("transactions").document(transaction_id)
-        tx_doc = tx_ref.get()
+        tx_doc = firestore_call(tx_ref.get)
         if not tx_doc.exists:
             return jsonify({"error": "Transaction not found"}), 404
         
         tx_data = tx_doc.to_dict()
+        if lease_held_by_other(tx_data, admin_uid):
+            return jsonify({"error": "This item is being reviewed by another admin."}), 409
         
         # 3. Handle REJECT action
         if action == "reject":
             if not comment:
                 return jsonify({"error": "Comment is required for rejection"}), 400
             
-            tx_ref.update({
+            firestore_call(tx_ref.update, {
                 "status": "Rejected",
                 "adminRejectionComment": comment,
-                "reviewedBy": admin_uid
+                "reviewedBy": admin_uid,
+                "rejectedAt": firestore.SERVER_TIMESTAMP
+            })
+            invalidate_transaction_detail(transaction_id)
+            
+            update_parcel_index(tx_data.get("parcelNumber"), {"activeTransactionId": None}, {
+                "type": "transaction-rejected",
+                "transactionId": transaction_id,
+                "actorUid": admin_uid,
+                "comment": comment
             })
             
             # (Notify advocate/buyer/seller...)
@@ -895,16 +2976,554 @@ def admin_review_transaction():
                 }
             }), 200
 
+        # 5. Handle FINALIZE action (after the on-chain approval succeeded)
+        elif action == "finalize":
+            final_tx_hash = data.get("finalTxHash")
+            if not final_tx_hash:
+                return jsonify({"error": "finalTxHash is required to finalize"}), 400
+            if tx_data.get("status") != "Under Review":
+                return jsonify({"error": f"Only a transaction under review can be finalized (status: {tx_data.get('status')})"}), 400
+
+            firestore_call(tx_ref.update, {
+                "status": "Finalized",
+                "finalTxHash": final_tx_hash,
+                "finalizedAt": firestore.SERVER_TIMESTAMP,
+                "reviewedBy": admin_uid
+            })
+            invalidate_transaction_detail(transaction_id)
+
+            buyer = tx_data.get("buyer", {})
+            seller = tx_data.get("seller", {})
+            update_parcel_index(tx_data.get("parcelNumber"), {
+                "ownerUid": buyer.get("uid"),
+                "ownerWalletAddress": buyer.get("walletAddress"),
+                "activeTransactionId": None
+            }, {
+                "type": "ownership-transferred",
+                "transactionId": transaction_id,
+                "actorUid": admin_uid,
+                "fromWalletAddress": seller.get("walletAddress"),
+                "toWalletAddress": buyer.get("walletAddress"),
+                "txHash": final_tx_hash
+            })
+
+            return jsonify({"message": "Transaction finalized successfully"}), 200
+
         else:
             return jsonify({"error": "Invalid action"}), 400
 
     except auth.InvalidIdTokenError:
         return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
     except Exception as e:
         print(f"Error in admin-review-transaction: {e}")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
-        
-        
+
+# ---
+# --- ENDPOINT 5: Run Archival Job ---
+# ---
+@app.route("/admin-run-archive", methods=["POST"])
+def admin_run_archive():
+    try:
+        # 1. Verify Admin
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return jsonify({"error": "Authorization header is missing"}), 401
+
+        id_token = auth_header.split("Bearer ")[1]
+        decoded_token = auth.verify_id_token(id_token)
+        admin_uid = decoded_token["uid"]
+
+        admin_doc = firestore_call(db.collection("users").document(admin_uid).get)
+        if not admin_doc.exists or not admin_doc.to_dict().get("isAdmin"):
+            return jsonify({"error": "Insufficient permissions."}), 403
+
+        # 2. Optional overrides from React
+        data, error_response = get_validated_json("admin-run-archive")
+        if error_response:
+            return error_response
+        min_age_days = data.get("minAgeDays", ARCHIVE_MIN_AGE_DAYS)
+        collections = data.get("collections")
+
+        if not isinstance(min_age_days, int) or min_age_days < 1:
+            return jsonify({"error": "minAgeDays must be a positive integer"}), 400
+        if collections is not None:
+            unknown = [str(c) for c in collections if not isinstance(c, str) or c not in ARCHIVE_POLICIES]
+            if unknown:
+                return jsonify({"error": f"Cannot archive collections: {', '.join(unknown)}"}), 400
+
+        # 3. Run the job
+        summary = archive_closed_records(min_age_days, collections)
+
+        return jsonify({"message": "Archival completed", "archived": summary}), 200
+
+    except auth.InvalidIdTokenError:
+        return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
+    except Exception as e:
+        print(f"Error in admin-run-archive: {e}")
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+# ---
+# --- ENDPOINT 6: Fetch Archived Record ---
+# ---
+@app.route("/get-archived-record", methods=["POST"])
+def get_archived_record_endpoint():
+    try:
+        # 1. Verify User (admins see everything, others only records they are on)
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return jsonify({"error": "Authorization header is missing"}), 401
+
+        id_token = auth_header.split("Bearer ")[1]
+        decoded_token = auth.verify_id_token(id_token)
+        user_uid = decoded_token["uid"]
+
+        user_doc = firestore_call(db.collection("users").document(user_uid).get)
+        if not user_doc.exists:
+            return jsonify({"error": "User profile not found."}), 403
+
+        user_data = user_doc.to_dict()
+
+        # 2. Get data from React
+        data, error_response = get_validated_json("get-archived-record")
+        if error_response:
+            return error_response
+        collection_name = data.get("collection")
+        doc_id = data.get("docId")
+
+        if not collection_name or not doc_id:
+            return jsonify({"error": "Missing collection or docId"}), 400
+        if collection_name not in ARCHIVE_POLICIES:
+            return jsonify({"error": "Unknown archive collection"}), 400
+
+        # 3. Read it back from cold storage
+        record = get_archived_record(collection_name, doc_id)
+        if record is None:
+            return jsonify({"error": "Archived record not found"}), 404
+
+        # Same answer as "not found", so record IDs can't be probed
+        owner_uids = {_get_dotted(record, field) for field in ARCHIVE_POLICIES[collection_name]["ownerFields"]}
+        if not user_data.get("isAdmin") and user_uid not in owner_uids:
+            return jsonify({"error": "Archived record not found"}), 404
+
+        return jsonify({"id": doc_id, "collection": collection_name, "data": record}), 200
+
+    except auth.InvalidIdTokenError:
+        return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
+    except Exception as e:
+        print(f"Error in get-archived-record: {e}")
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+# ---
+# --- ENDPOINT 7: Streaming Export (CSV / NDJSON) ---
+# ---
+@app.route("/export-records", methods=["GET"])
+def export_records():
+    try:
+        # 1. Verify Admin
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return jsonify({"error": "Authorization header is missing"}), 401
+
+        id_token = auth_header.split("Bearer ")[1]
+        decoded_token = auth.verify_id_token(id_token)
+        admin_uid = decoded_token["uid"]
+
+        admin_doc = firestore_call(db.collection("users").document(admin_uid).get)
+        if not admin_doc.exists or not admin_doc.to_dict().get("isAdmin"):
+            return jsonify({"error": "Insufficient permissions."}), 403
+
+        # 2. Get filters from the query string
+        collection_name = request.args.get("collection")
+        export_format = request.args.get("format", "csv")
+        compress = request.args.get("gzip") in ("1", "true")
+        status = request.args.get("status")
+        advocate_uid = request.args.get("advocateUid")
+
+        if collection_name not in EXPORT_POLICIES:
+            return jsonify({"error": f"Collection must be one of: {', '.join(EXPORT_POLICIES)}"}), 400
+        if export_format not in ("csv", "ndjson"):
+            return jsonify({"error": "Format must be 'csv' or 'ndjson'"}), 400
+        if advocate_uid and not EXPORT_POLICIES[collection_name]["advocateField"]:
+            return jsonify({"error": f"'{collection_name}' cannot be filtered by advocate"}), 400
+
+        try:
+            dates = {}
+            for param in ("startDate", "endDate"):
+                value = request.args.get(param)
+                if value:
+                    parsed = datetime.datetime.fromisoformat(value)
+                    dates[param] = parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            return jsonify({"error": "startDate and endDate must be ISO-8601 dates"}), 400
+
+        # 3. Stream the response page by page
+        query = _build_export_query(
+            collection_name,
+            start_date=dates.get("startDate"),
+            end_date=dates.get("endDate"),
+            status=status,
+            advocate_uid=advocate_uid
+        )
+
+        # Run the first page before answering, so a missing index or a bad
+        # filter comes back as an error status instead of a truncated file
+        snapshots = iter_export_snapshots(query)
+        first_snapshot = next(snapshots, None)
+        if first_snapshot is not None:
+            snapshots = itertools.chain([first_snapshot], snapshots)
+
+        file_name = f"{collection_name}-{datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d%H%M%S')}.{export_format}"
+        headers = {"X-Accel-Buffering": "no"} # Stop proxies from buffering the whole export
+        if compress:
+            file_name += ".gz"
+            mimetype = "application/gzip"
+        else:
+            mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+        headers["Content-Disposition"] = f"attachment; filename={file_name}"
+
+        print(f"Admin {admin_uid} started export of '{collection_name}' ({export_format}).")
+        return Response(
+            stream_with_context(generate_export(collection_name, snapshots, export_format, compress)),
+            mimetype=mimetype,
+            headers=headers
+        )
+
+    except auth.InvalidIdTokenError:
+        return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
+    except Exception as e:
+        print(f"Error in export-records: {e}")
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+# ---
+# --- ENDPOINT 8: Parcel Ownership History ---
+# ---
+@app.route("/parcel-history", methods=["POST"])
+def parcel_history():
+    try:
+        # 1. Verify Advocate/Admin
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return jsonify({"error": "Authorization header is missing"}), 401
+
+        id_token = auth_header.split("Bearer ")[1]
+        decoded_token = auth.verify_id_token(id_token)
+        user_uid = decoded_token["uid"]
+
+        user_doc = firestore_call(db.collection("users").document(user_uid).get)
+        if not user_doc.exists:
+            return jsonify({"error": "User profile not found."}), 403
+
+        user_data = user_doc.to_dict()
+        if not user_data.get("isAdvocate") and not user_data.get("isAdmin"):
+            return jsonify({"error": "Insufficient permissions."}), 403
+
+        # 2. Get data from React
+        data, error_response = get_validated_json("parcel-history")
+        if error_response:
+            return error_response
+        parcel_number = data.get("parcelNumber")
+
+        # 3. Current state (single-key read) + timeline
+        entry = get_parcel_entry(parcel_number)
+        if entry is None:
+            return jsonify({"error": f"Parcel '{parcel_number}' is not registered."}), 404
+
+        timeline = get_parcel_timeline(parcel_number)
+
+        return app.response_class(
+            json.dumps({"parcel": entry, "timeline": timeline}, default=_firestore_json_default),
+            status=200,
+            mimetype="application/json"
+        )
+
+    except auth.InvalidIdTokenError:
+        return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
+    except Exception as e:
+        print(f"Error in parcel-history: {e}")
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+# ---
+# --- ENDPOINT 9: Review Queue Leases (claim / heartbeat / release) ---
+# ---
+@app.route("/review-queue-lease", methods=["POST"])
+def review_queue_lease():
+    try:
+        # 1. Verify Admin
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return jsonify({"error": "Authorization header is missing"}), 401
+
+        id_token = auth_header.split("Bearer ")[1]
+        decoded_token = auth.verify_id_token(id_token)
+        admin_uid = decoded_token["uid"]
+
+        admin_doc = firestore_call(db.collection("users").document(admin_uid).get)
+        if not admin_doc.exists or not admin_doc.to_dict().get("isAdmin"):
+            return jsonify({"error": "Insufficient permissions."}), 403
+
+        # 2. Get data from React
+        data, error_response = get_validated_json("review-queue-lease")
+        if error_response:
+            return error_response
+        queue_name = data.get("queue")
+        action = data.get("action")
+        count = data.get("count") or 1
+        item_ids = data.get("itemIds") or []
+
+        if any(not isinstance(item_id, str) or not item_id or "/" in item_id for item_id in item_ids):
+            return jsonify({"error": "itemIds must be document IDs"}), 400
+
+        # 3. Handle CLAIM action
+        if action == "claim":
+            if count < 1 or count > QUEUE_MAX_CLAIM:
+                return jsonify({"error": f"count must be between 1 and {QUEUE_MAX_CLAIM}"}), 400
+
+            claimed = claim_review_items(queue_name, admin_uid, count, item_ids)
+            if item_ids and not claimed:
+                return jsonify({"error": "This item has already been claimed by another admin."}), 409
+
+            return app.response_class(
+                json.dumps({"claimed": claimed, "leaseSeconds": QUEUE_LEASE_SECONDS}, default=_firestore_json_default),
+                status=200,
+                mimetype="application/json"
+            )
+
+        if not item_ids:
+            return jsonify({"error": "itemIds is required"}), 400
+
+        # 4. Handle HEARTBEAT action
+        if action == "heartbeat":
+            renewed = renew_review_leases(queue_name, admin_uid, item_ids)
+            lost = [item_id for item_id in item_ids if item_id not in renewed]
+            return jsonify({
+                "renewed": {item_id: expires.isoformat() for item_id, expires in renewed.items()},
+                "lost": lost
+            }), 200
+
+        # 5. Handle RELEASE action
+        released = release_review_items(queue_name, admin_uid, item_ids)
+        return jsonify({"released": released}), 200
+
+    except auth.InvalidIdTokenError:
+        return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
+    except Exception as e:
+        print(f"Error in review-queue-lease: {e}")
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+# ---
+# --- ENDPOINT 10: Search (parcels, locations, parties, national IDs) ---
+# ---
+@app.route("/search", methods=["GET"])
+def search():
+    try:
+        # 1. Verify Advocate/Admin
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return jsonify({"error": "Authorization header is missing"}), 401
+
+        id_token = auth_header.split("Bearer ")[1]
+        decoded_token = auth.verify_id_token(id_token)
+        user_uid = decoded_token["uid"]
+
+        user_doc = firestore_call(db.collection("users").document(user_uid).get)
+        if not user_doc.exists:
+            return jsonify({"error": "User profile not found."}), 403
+
+        user_data = user_doc.to_dict()
+        is_admin = bool(user_data.get("isAdmin"))
+        if not user_data.get("isAdvocate") and not is_admin:
+            return jsonify({"error": "Insufficient permissions."}), 403
+
+        # 2. Get the query from the query string
+        query_text = request.args.get("q", "").strip()
+        kinds = request.args.get("kinds")
+        kinds = set(kinds.split(",")) if kinds else None
+
+        if not query_text or len(query_text) > 200:
+            return jsonify({"error": "q must be between 1 and 200 characters"}), 400
+        if kinds and not kinds <= set(SEARCH_SOURCES):
+            return jsonify({"error": f"kinds must be a comma-separated list of: {', '.join(SEARCH_SOURCES)}"}), 400
+        try:
+            page = int(request.args.get("page", "1"))
+            page_size = int(request.args.get("pageSize", "20"))
+        except ValueError:
+            return jsonify({"error": "page and pageSize must be integers"}), 400
+        if page < 1 or page_size < 1 or page_size > SEARCH_MAX_PAGE_SIZE:
+            return jsonify({"error": f"page must be >= 1 and pageSize between 1 and {SEARCH_MAX_PAGE_SIZE}"}), 400
+
+        # 3. Rank and paginate
+        index = get_search_index()
+        if index is None:
+            return jsonify({"error": "Search index is still being built. Please try again shortly."}), 503
+
+        if is_admin:
+            results = index.search(query_text, kinds)
+        else:
+            # Advocates get no prefix/fuzzy matching on people, only an exact national ID hit
+            results = index.search(query_text, (kinds or set(SEARCH_SOURCES)) - SEARCH_ADMIN_ONLY_KINDS)
+            if kinds is None or "users" in kinds:
+                id_match = hedged_read(_find_first_doc, "users", "idNumber", query_text)
+                if id_match is not None:
+                    results.insert(0, {**_search_record("users", id_match.id, id_match.to_dict()), "score": 3.0})
+        start = (page - 1) * page_size
+
+        return jsonify({
+            "results": results[start:start + page_size],
+            "total": len(results),
+            "page": page,
+            "pageSize": page_size
+        }), 200
+
+    except auth.InvalidIdTokenError:
+        return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
+    except Exception as e:
+        print(f"Error in search: {e}")
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+# ---
+# --- ENDPOINT 11: Analytics Reports (read from the local CDC store) ---
+# ---
+@app.route("/analytics-report", methods=["GET"])
+def analytics_report():
+    try:
+        # 1. Verify Admin
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return jsonify({"error": "Authorization header is missing"}), 401
+
+        id_token = auth_header.split("Bearer ")[1]
+        decoded_token = auth.verify_id_token(id_token)
+        admin_uid = decoded_token["uid"]
+
+        admin_doc = firestore_call(db.collection("users").document(admin_uid).get)
+        if not admin_doc.exists or not admin_doc.to_dict().get("isAdmin"):
+            return jsonify({"error": "Insufficient permissions."}), 403
+
+        # 2. Get parameters from the query string
+        report_name = request.args.get("report")
+        if report_name not in ANALYTICS_REPORTS:
+            return jsonify({"error": f"report must be one of: {', '.join(ANALYTICS_REPORTS)}"}), 400
+
+        params = {
+            "start": None,
+            "end": None,
+            "advocate": request.args.get("advocateUid") or None, # stage-durations, advocate-rejection-rates
+            "reviewer": request.args.get("reviewerUid") or None, # property-approval-turnaround (the approving admin)
+        }
+        try:
+            for param, key in (("startDate", "start"), ("endDate", "end")):
+                value = request.args.get(param)
+                if value:
+                    params[key] = _iso(datetime.datetime.fromisoformat(value))
+        except ValueError:
+            return jsonify({"error": "startDate and endDate must be ISO-8601 dates"}), 400
+
+        # 3. Run the report against the local store
+        conn = open_analytics_db(read_only=True)
+        if conn is None:
+            return jsonify({"error": "Analytics store is not available yet. Start it with `flask --app app cdc`."}), 503
+        try:
+            rows = [dict(row) for row in conn.execute(ANALYTICS_REPORTS[report_name], params)]
+            synced = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        finally:
+            conn.close()
+
+        return jsonify({"report": report_name, "parameters": params, "rows": rows, "transactionsInStore": synced}), 200
+
+    except auth.InvalidIdTokenError:
+        return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
+    except Exception as e:
+        print(f"Error in analytics-report: {e}")
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+# ---
+# --- ENDPOINT 12: Transaction Detail (everything a stage page needs, one call) ---
+# ---
+@app.route("/transaction-detail", methods=["GET"])
+def transaction_detail():
+    try:
+        # 1. Verify User
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return jsonify({"error": "Authorization header is missing"}), 401
+
+        id_token = auth_header.split("Bearer ")[1]
+        decoded_token = auth.verify_id_token(id_token)
+        user_uid = decoded_token["uid"]
+
+        # 2. Get parameters from the query string
+        transaction_id = request.args.get("transactionId", "")
+        reserved_id = transaction_id.startswith("__") and transaction_id.endswith("__")
+        if not transaction_id or len(transaction_id) > 128 or "/" in transaction_id or reserved_id:
+            return jsonify({"error": "A valid transactionId is required"}), 400
+
+        # 3. The transaction itself is always read fresh
+        tx_doc = hedged_read(_get_doc, "transactions", transaction_id)
+        if tx_doc is None:
+            return jsonify({"error": "Transaction not found"}), 404
+        tx_data = tx_doc.to_dict()
+
+        # 4. Only the parties on the deal (or an admin) may see it
+        party_uids = {(tx_data.get(role) or {}).get("uid") for role in ("buyer", "seller", "advocate")}
+        if user_uid not in party_uids:
+            user_doc = hedged_read(_get_doc, "users", user_uid)
+            if user_doc is None or not user_doc.to_dict().get("isAdmin"):
+                return jsonify({"error": "Insufficient permissions."}), 403
+
+        # 5. Aggregate, then let the browser skip the body if nothing changed
+        body = json.dumps(get_transaction_detail(transaction_id, tx_data), default=_firestore_json_default, sort_keys=True)
+        etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        return app.response_class(body, status=200, mimetype="application/json", headers=headers)
+
+    except auth.InvalidIdTokenError:
+        return jsonify({"error": "Invalid or expired token"}), 403
+    except DependencyUnavailable as e:
+        return jsonify({"error": f"{e}. Please try again shortly."}), 503
+    except Exception as e:
+        print(f"Error in transaction-detail: {e}")
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+# --- CLI: `flask --app app archive` (e.g. from a nightly cron) ---
+@app.cli.command("archive")
+def archive_command():
+    """Moves closed records past ARCHIVE_MIN_AGE_DAYS into cold storage."""
+    summary = archive_closed_records()
+    print(f"Archival completed: {summary}")
+
+# --- CLI: `flask --app app cdc` (long-running; run exactly one) ---
+@app.cli.command("cdc")
+def cdc_command():
+    """Tails Firestore into the local analytics store used by /analytics-report."""
+    run_cdc()
+
+# --- CLI: `flask --app app search-indexer` (long-running; run exactly one) ---
+@app.cli.command("search-indexer")
+def search_indexer_command():
+    """Keeps the search index snapshot read by /search up to date."""
+    run_search_indexer()
+
+
 # --- Run the Server ---
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
\ No newline at end of file
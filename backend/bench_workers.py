@@ -0,0 +1,111 @@
+"""
+Measures API throughput as the number of gunicorn workers grows.
+
+Starts `gunicorn -c gunicorn.conf.py app:app` once per worker count, hammers
+an endpoint from a pool of client threads, and prints requests/second.
+
+Pick a path that reads Firestore, otherwise only gunicorn's own overhead is
+measured. A representative one is the stage-page read, which needs a Firebase
+ID token of a party on the deal (or an admin):
+    /transaction-detail?transactionId=<id>
+Non-2xx responses count as errors, so check that column before trusting req/s.
+
+Usage (from the backend/ folder, with serviceAccountKey.json present):
+    python bench_workers.py --path "/transaction-detail?transactionId=<id>" --token "$ID_TOKEN" --workers 1 2 4 8 --duration 10 --clients 32
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def wait_until_ready(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return True
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    return False
+
+
+def make_request(url, token):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return urllib.request.Request(url, headers=headers)
+
+
+def run_load(url, token, duration, clients):
+    """Sends requests from `clients` threads for `duration` seconds. Returns (ok, errors)."""
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client():
+        ok = errors = 0
+        while time.time() < stop_at:
+            try:
+                with urllib.request.urlopen(make_request(url, token), timeout=10) as response:
+                    response.read()
+                ok += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["ok"] += ok
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return counts["ok"], counts["errors"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--duration", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--path", required=True, help="Firestore-backed path to load, e.g. /transaction-detail?transactionId=<id>")
+    parser.add_argument("--token", default=os.getenv("BENCH_ID_TOKEN"), help="Firebase ID token sent as a Bearer header (or set BENCH_ID_TOKEN)")
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    ready_url = f"http://127.0.0.1:{args.port}/healthz"
+    print(f"{'workers':>8} {'threads':>8} {'req/s':>10} {'errors':>8}")
+
+    for worker_count in args.workers:
+        env = dict(os.environ,
+                   WEB_CONCURRENCY=str(worker_count),
+                   GUNICORN_THREADS=str(args.threads),
+                   BIND=f"127.0.0.1:{args.port}")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", "", "app:app"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not wait_until_ready(ready_url):
+                print(f"{worker_count:>8} server did not start")
+                continue
+            started = time.time()
+            ok, errors = run_load(url, args.token, args.duration, args.clients)
+            elapsed = time.time() - started
+            print(f"{worker_count:>8} {args.threads:>8} {ok / elapsed:>10.1f} {errors:>8}")
+        finally:
+            # SIGTERM = graceful shutdown, same path as a real deploy
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Production server config for the Nexus API.
+
+Run from the backend/ folder:
+    gunicorn -c gunicorn.conf.py app:app
+
+(gunicorn does not run on Windows; use `python app.py` for local development there.)
+"""
+import multiprocessing
+import os
+
+# Firebase clients hold gRPC channels that must not cross a fork, so app.py
+# skips its import-time init and each worker creates its own in post_fork.
+os.environ.setdefault("DEFER_FIREBASE_INIT", "1")
+
+# --- Workers ---
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# --- Timeouts ---
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30")) # Time a worker gets to drain background work
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't build up
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+
+# --- Logging ---
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """Creates this worker's own Firebase/Firestore/Storage clients."""
+    import app as nexus_app
+    nexus_app.init_firebase()
+    server.log.info(f"Worker {worker.pid}: Firebase clients initialized.")
+
+
+def worker_exit(server, worker):
+    """Lets queued emails and other background work finish before the worker exits."""
+    import app as nexus_app
+    nexus_app.drain_background_work()
@@ -3,6 +3,7 @@ import { useParams } from 'react-router-dom';
 import { doc, onSnapshot } from 'firebase/firestore';
 import { db } from './firebaseConfig';
 import { useAuth } from './hooks/useAuth';
+import { useReviewLease } from './hooks/useReviewLease';
 
 // Reusable components
 import DealHeader from './components/DealHeader';
@@ -21,6 +22,9 @@ const AdminTransactionDetailPage = () => {
   const [transaction, setTransaction] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
 
+  // Keep this transaction leased to us while it's open for review
+  const { leaseError } = useReviewLease('transactions', transactionId, transaction?.status === 'Under Review');
+
   useEffect(() => {
     if (!transactionId || !currentUser) return;
 
@@ -95,8 +99,10 @@ const AdminTransactionDetailPage = () => {
           <TransactionDetails transaction={transaction} />
         </div>
         
+        {leaseError && <p className="error-message">{leaseError}</p>}
+
         {/* Card 2: Admin Actions */}
-        {stageComponent && (
+        {stageComponent && !leaseError && (
           <div className="tab-content-container">
             {stageComponent}
           </div>
@@ -2,12 +2,15 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { db } from './firebaseConfig';
 import { useAuth } from './hooks/useAuth';
-import { collection, query, where, onSnapshot, doc, updateDoc } from 'firebase/firestore';
+import { isLeaseAvailable } from './hooks/useReviewLease';
+import { collection, query, where, onSnapshot } from 'firebase/firestore';
 import './AdminTransactionRequests.css'; // We'll add tab styles to this
 
 const AdminTransactionRequests = () => {
   const [activeTab, setActiveTab] = useState('pending'); // 'pending' or 'mine'
-  const [pendingTransactions, setPendingTransactions] = useState([]);
+  const [unassignedTransactions, setUnassignedTransactions] = useState([]);
+  const [expiredLeaseTransactions, setExpiredLeaseTransactions] = useState([]);
+  const [now, setNow] = useState(new Date());
   const [myTransactions, setMyTransactions] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   
@@ -26,7 +29,7 @@ const AdminTransactionRequests = () => {
       where("assignedAdmin", "==", null)     // <-- Find unassigned ones
     );
     const unsubscribe = onSnapshot(transactionsQuery, (snapshot) => {
-      setPendingTransactions(snapshot.docs.map(doc => ({ id: doc.id, ...doc.data() })));
+      setUnassignedTransactions(snapshot.docs.map(doc => ({ id: doc.id, ...doc.data() })));
       setIsLoading(false);
     }, (error) => {
       console.error("Error fetching pending transactions:", error);
@@ -35,6 +38,32 @@ const AdminTransactionRequests = () => {
     return () => unsubscribe();
   }, []); // Run only once on mount
 
+  // Leases expire without a write, so re-check them every so often
+  useEffect(() => {
+    const timer = setInterval(() => setNow(new Date()), 30000);
+    return () => clearInterval(timer);
+  }, []);
+
+  // Effect for claimed Transactions whose lease ran out (back in the pool)
+  useEffect(() => {
+    const expiredQuery = query(
+      collection(db, "transactions"),
+      where("status", "==", "Under Review"),
+      where("leaseExpiresAt", "<", now)
+    );
+    const unsubscribe = onSnapshot(expiredQuery, (snapshot) => {
+      setExpiredLeaseTransactions(snapshot.docs.map(doc => ({ id: doc.id, ...doc.data() })));
+    }, (error) => {
+      console.error("Error fetching expired transaction leases:", error);
+    });
+    return () => unsubscribe();
+  }, [now]);
+
+  const pendingTransactions = [
+    ...unassignedTransactions,
+    ...expiredLeaseTransactions.filter(tx => isLeaseAvailable(tx, currentUser?.uid, now))
+  ];
+
   // Effect for My Transactions (This query was already correct)
   useEffect(() => {
     if (!currentUser) return;
@@ -62,15 +91,25 @@ const AdminTransactionRequests = () => {
       return;
     }
     try {
-      const txDocRef = doc(db, "transactions", id);
-      // The status is already "Under Review", so we just need to assign it.
-      await updateDoc(txDocRef, {
-        assignedAdmin: currentUser.uid
+      // The backend leases it atomically, so two admins can't claim the same transaction
+      const idToken = await currentUser.getIdToken();
+      const response = await fetch('http://localhost:5000/review-queue-lease', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${idToken}`
+        },
+        body: JSON.stringify({ queue: 'transactions', action: 'claim', itemIds: [id] })
       });
+      const result = await response.json();
+      if (!response.ok) {
+        throw new Error(result.error || 'Failed to claim transaction.');
+      }
       // The onSnapshot listeners will automatically move it from "Pending" to "My Queue"
       navigate(`/admin/transactions/${id}`);
     } catch (err) {
       console.error("Error assigning transaction:", err);
+      alert(err.message);
     }
   };
 
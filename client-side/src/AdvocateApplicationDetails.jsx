@@ -4,6 +4,7 @@ import { useParams, useNavigate } from 'react-router-dom';
 import { db } from './firebaseConfig'; 
 import { doc, getDoc } from 'firebase/firestore'; // Removed direct 'updateDoc'
 import { useAuth } from './hooks/useAuth'; // Get current user
+import { useReviewLease } from './hooks/useReviewLease';
 import { ethers } from 'ethers'; 
 import { CONTRACT_ADDRESS, CONTRACT_ABI } from './constants'; 
 
@@ -237,6 +238,9 @@ const AdvocateApplicationDetails = () => {
   const [application, setApplication] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
   const { applicationId } = useParams();
+
+  // Keep this application leased to us while it's open for review
+  const { leaseError } = useReviewLease('advocateApplications', applicationId, application?.status === 'pending');
   
   useEffect(() => {
     if (!applicationId) return;
@@ -332,7 +336,11 @@ const AdvocateApplicationDetails = () => {
             </div>
           </div>
           
-          <AdminActionsCard application={application} />
+          {leaseError ? (
+            <p className="error-message">{leaseError}</p>
+          ) : (
+            <AdminActionsCard application={application} />
+          )}
         </aside>
       </div>
     </div>
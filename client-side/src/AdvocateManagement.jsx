@@ -2,13 +2,12 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { db } from './firebaseConfig'; // Import your Firestore db
 import { useAuth } from './hooks/useAuth'; // Import useAuth to get admin ID
+import { isLeaseAvailable } from './hooks/useReviewLease';
 import { 
   collection, 
   query, 
   where, 
-  onSnapshot, 
-  doc, 
-  updateDoc 
+  onSnapshot 
 } from 'firebase/firestore';
 import './AdvocateManagement.css'; 
 
@@ -20,7 +19,9 @@ const AdvocateManagement = () => {
   const [activeTab, setActiveTab] = useState('pending'); // 'pending', 'queue', 'verified'
   
   // State to hold the live data from Firestore
-  const [pendingApplications, setPendingApplications] = useState([]);
+  const [unassignedApplications, setUnassignedApplications] = useState([]);
+  const [expiredLeaseApplications, setExpiredLeaseApplications] = useState([]);
+  const [now, setNow] = useState(new Date());
   const [myQueue, setMyQueue] = useState([]);
   const [verifiedAdvocates, setVerifiedAdvocates] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -41,7 +42,7 @@ const AdvocateManagement = () => {
       where("assignedAdmin", "==", null)
     );
     const unsubPending = onSnapshot(pendingQuery, (snapshot) => {
-      setPendingApplications(snapshot.docs.map(doc => ({ id: doc.id, ...doc.data() })));
+      setUnassignedApplications(snapshot.docs.map(doc => ({ id: doc.id, ...doc.data() })));
       setLoading(false);
     });
 
@@ -74,6 +75,32 @@ const AdvocateManagement = () => {
     };
   }, [currentUser]); // Re-run if the user changes
 
+  // Leases expire without a write, so re-check them every so often
+  useEffect(() => {
+    const timer = setInterval(() => setNow(new Date()), 30000);
+    return () => clearInterval(timer);
+  }, []);
+
+  // Claimed applications whose lease ran out go back in the pool
+  useEffect(() => {
+    if (!currentUser) return;
+
+    const expiredQuery = query(
+      collection(db, "advocateApplications"),
+      where("status", "==", "pending"),
+      where("leaseExpiresAt", "<", now)
+    );
+    const unsubExpired = onSnapshot(expiredQuery, (snapshot) => {
+      setExpiredLeaseApplications(snapshot.docs.map(doc => ({ id: doc.id, ...doc.data() })));
+    });
+    return () => unsubExpired();
+  }, [currentUser, now]);
+
+  const pendingApplications = [
+    ...unassignedApplications,
+    ...expiredLeaseApplications.filter(app => isLeaseAvailable(app, currentUser?.uid, now))
+  ];
+
   const handleSuspend = (id) => {
     // In a real app, you would update the user's doc here
     // await updateDoc(doc(db, "users", id), { isSuspended: true });
@@ -88,17 +115,26 @@ const AdvocateManagement = () => {
   const handleClaimAndReview = async (id) => {
     if (!currentUser) return;
 
-    // 1. "Claim" the application by updating its doc in Firestore
-    const appDocRef = doc(db, "advocateApplications", id);
+    // 1. "Claim" the application through the backend, which leases it atomically
     try {
-      await updateDoc(appDocRef, {
-        assignedAdmin: currentUser.uid
+      const idToken = await currentUser.getIdToken();
+      const response = await fetch('http://localhost:5000/review-queue-lease', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${idToken}`
+        },
+        body: JSON.stringify({ queue: 'advocateApplications', action: 'claim', itemIds: [id] })
       });
+      const result = await response.json();
+      if (!response.ok) {
+        throw new Error(result.error);
+      }
       // 2. After successfully claiming, navigate to the details page
       navigate(`/admin/advocates/${id}`);
     } catch (error) {
       console.error("Error claiming application:", error);
-      alert("Failed to claim application. Please try again.");
+      alert(error.message || "Failed to claim application. Please try again.");
     }
   };
 
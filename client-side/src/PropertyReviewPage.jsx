@@ -4,6 +4,7 @@ import { useParams, useNavigate } from 'react-router-dom';
 import { db } from './firebaseConfig';
 import { doc, getDoc, collection, addDoc, serverTimestamp, updateDoc } from 'firebase/firestore';
 import { useAuth } from './hooks/useAuth'; // To get admin auth token
+import { useReviewLease } from './hooks/useReviewLease';
 
 import { ethers } from 'ethers'; // --- 1. Import Ethers ---
 import { CONTRACT_ADDRESS, CONTRACT_ABI } from './constants'; // --- 2. Import Contract Constants ---
@@ -50,6 +51,9 @@ const PropertyReviewPage = () => {
   const { propertyId } = useParams();
   const { currentUser, userData } = useAuth(); // Get admin data for logging
   const navigate = useNavigate();
+
+  // Keep this property leased to us while it's open for review
+  const { leaseError } = useReviewLease('properties', propertyId, property?.status === 'pending');
   
   // Fetch property data on component mount
   useEffect(() => {
@@ -329,7 +333,9 @@ const PropertyReviewPage = () => {
                 {isMinted ? "MINTED" : property.status}
             </span>
             
-            {!isRejecting ? (
+            {leaseError ? (
+              <p className="error-message">{leaseError}</p>
+            ) : !isRejecting ? (
               <div className="action-buttons">
                 {(!isApproved && !isMinted) && (
                   <button 
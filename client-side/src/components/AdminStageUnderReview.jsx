@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import './AdminStageUnderReview.css';
 import { useAuth } from '../hooks/useAuth';
-import { doc, updateDoc, addDoc, collection, serverTimestamp } from 'firebase/firestore'; // Import firestore functions
+import { addDoc, collection, serverTimestamp } from 'firebase/firestore'; // Import firestore functions
 import { db } from '../firebaseConfig'; // Import db
 import { ethers } from 'ethers'; // Import ethers
 import { CONTRACT_ADDRESS, CONTRACT_ABI } from '../constants'; // Import contract details
@@ -112,13 +112,24 @@ const AdminStageUnderReview = ({ transaction }) => {
       
       console.log("Final transfer successful, txHash:", finalTxHash);
 
-      // --- STEP 3: Update Firestore with Final Status & Log ---
-      const txDocRef = doc(db, "transactions", transaction.id);
-      await updateDoc(txDocRef, {
-        status: "Finalized",
-        finalTxHash: finalTxHash,
-        finalizedAt: serverTimestamp()
+      // --- STEP 3: Let the backend record the final status & new owner, then log ---
+      const finalizeResponse = await fetch('http://localhost:5000/admin-review-transaction', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${token}`
+        },
+        body: JSON.stringify({
+          transactionId: transaction.id,
+          action: 'finalize',
+          finalTxHash: finalTxHash
+        })
       });
+
+      const finalizeData = await finalizeResponse.json();
+      if (!finalizeResponse.ok) {
+        throw new Error(finalizeData.error || 'Ownership was transferred on-chain, but saving the final status failed.');
+      }
       
       const adminName = userData?.firstName || currentUser.email;
       await addDoc(collection(db, "logs"), {
@@ -82,10 +82,11 @@ const AdvocateStageDocsShared = ({ transaction }) => {
       
       formData.append('transactionId', transaction.id);
       
-      // Append all files and their corresponding names
+      // Append each document's name before its file: the backend streams
+      // every file to storage as soon as it arrives and needs the name by then
       stagedFiles.forEach(stagedFile => {
-        formData.append('files', stagedFile.file);
         formData.append('docNames', stagedFile.name);
+        formData.append('files', stagedFile.file);
       });
 
       // ---
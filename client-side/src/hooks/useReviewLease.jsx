@@ -0,0 +1,78 @@
+import { useState, useEffect } from 'react';
+import { useAuth } from './useAuth';
+
+const LEASE_URL = 'http://localhost:5000/review-queue-lease';
+
+// True if an admin can pick this item up: nobody has it, or the other admin's lease ran out.
+// (Items assigned before leases existed have no leaseExpiresAt and stay with that admin.)
+export function isLeaseAvailable(item, adminUid, now = new Date()) {
+  if (!item.assignedAdmin) return true;
+  if (item.assignedAdmin === adminUid) return false; // Already in "My Queue"
+  const expiresAt = item.leaseExpiresAt?.toDate ? item.leaseExpiresAt.toDate() : null;
+  return expiresAt !== null && expiresAt < now;
+}
+
+// Holds the review lease on one item while a detail page is open:
+// claims it on open and sends heartbeats while open. Leaving the page only
+// stops the heartbeat, so the item stays in "My Queue" until the lease runs out.
+export function useReviewLease(queue, itemId, enabled = true) {
+  const { currentUser } = useAuth();
+  const [leaseError, setLeaseError] = useState('');
+
+  useEffect(() => {
+    if (!enabled || !queue || !itemId || !currentUser) return;
+
+    let cancelled = false;
+    let heartbeatTimer = null;
+
+    const callLease = async (action) => {
+      const idToken = await currentUser.getIdToken();
+      const response = await fetch(LEASE_URL, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${idToken}`
+        },
+        body: JSON.stringify({ queue, action, itemIds: [itemId] })
+      });
+      return { ok: response.ok, data: await response.json() };
+    };
+
+    const start = async () => {
+      try {
+        const { ok, data } = await callLease('claim');
+        if (cancelled) return;
+        if (!ok) {
+          setLeaseError(data.error || 'This item is being reviewed by another admin.');
+          return;
+        }
+        setLeaseError('');
+
+        // Renew well before the lease runs out
+        const intervalMs = Math.max(30, (data.leaseSeconds || 1800) / 3) * 1000;
+        heartbeatTimer = setInterval(async () => {
+          try {
+            const { data: beat } = await callLease('heartbeat');
+            if (beat.lost?.includes(itemId)) {
+              clearInterval(heartbeatTimer);
+              setLeaseError('Your review lease expired and this item was claimed by another admin.');
+            }
+          } catch (err) {
+            console.error("Error renewing review lease:", err);
+          }
+        }, intervalMs);
+      } catch (err) {
+        console.error("Error claiming review lease:", err);
+      }
+    };
+
+    start();
+
+    return () => {
+      cancelled = true;
+      clearInterval(heartbeatTimer);
+    };
+  }, [queue, itemId, enabled, currentUser]);
+
+  return { leaseError };
+}